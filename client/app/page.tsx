@@ -39,9 +39,22 @@ export default function Dashboard() {
 
   useEffect(() => {
     loadDashboardData();
-    // Poll for agent status updates every 5 seconds
-    const interval = setInterval(loadAgentStatus, 5000);
-    return () => clearInterval(interval);
+    // Receive agent status updates as they happen; fall back to polling
+    // every 5 seconds if the event stream is unavailable
+    let interval: ReturnType<typeof setInterval> | undefined;
+    const events = agentService.subscribe(
+      (update) => {
+        setAgents(update.agents || []);
+        setSummary(update.summary);
+      },
+      () => {
+        if (!interval) interval = setInterval(loadAgentStatus, 5000);
+      }
+    );
+    return () => {
+      events.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   const loadDashboardData = async () => {
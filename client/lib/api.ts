@@ -95,9 +95,26 @@ export const researchService = {
     }),
 };
 
+export interface AgentStatusUpdate {
+  version: number;
+  agents: AgentStatus[];
+  summary: ResearchSummary;
+}
+
 export const agentService = {
   getStatus: () => api.get<{ agents: AgentStatus[]; summary: ResearchSummary }>('/api/agents/status'),
   getAgentStatus: (agentId: string) => api.get<AgentStatus>(`/api/agents/status/${agentId}`),
+  
+  // Server-pushed status updates; onError fires once if the stream is unavailable
+  subscribe: (onUpdate: (update: AgentStatusUpdate) => void, onError?: () => void) => {
+    const source = new EventSource(`${API_BASE_URL}/api/agents/events`);
+    source.onmessage = (event) => onUpdate(JSON.parse(event.data));
+    source.onerror = () => {
+      source.close();
+      onError?.();
+    };
+    return source;
+  },
 };
 
 export const companyService = {
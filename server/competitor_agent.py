@@ -1,32 +1,175 @@
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+import orjson
+from typing import List, Dict, Any, Optional, Tuple, Final
 from bs4 import BeautifulSoup
 import json
 import re
+from collections import Counter
+from database import DatabaseManager
+
+# How long LLM competitor lists stay fresh
+LLM_CACHE_TTL_SECONDS: Final = 24 * 3600
+
+_NUM_PREFIX_RE: Final = re.compile(r'^\d+\.\s*')
+
+# Comprehensive competitor database organized by company and industry
+_MOCK_RESULTS: Final[Dict[str, Tuple[str, ...]]] = {
+    # Sales & Marketing Tools
+    "apollo": ("Outreach", "SalesLoft", "HubSpot", "Pipedrive", "Salesforce", "ZoomInfo", "LinkedIn Sales Navigator"),
+    "lemlist": ("Outreach", "Reply.io", "Woodpecker", "Mailshake", "QuickMail", "SalesLoft", "Klenty"),
+    "outreach": ("Apollo", "SalesLoft", "Lemlist", "HubSpot", "Pipedrive", "Reply.io"),
+    "salesloft": ("Outreach", "Apollo", "HubSpot", "Pipedrive", "Lemlist", "Groove"),
+    "mailshake": ("Lemlist", "Outreach", "Reply.io", "Woodpecker", "QuickMail", "Klenty"),
+    
+    # CRM Platforms
+    "salesforce": ("HubSpot", "Pipedrive", "Microsoft Dynamics 365", "Zoho CRM", "Oracle Sales Cloud", "SugarCRM"),
+    "hubspot": ("Salesforce", "Pipedrive", "Zoho CRM", "ActiveCampaign", "Marketo", "Pardot"),
+    "pipedrive": ("HubSpot", "Salesforce", "Zoho CRM", "Freshsales", "Close", "Copper"),
+    "zoho": ("HubSpot", "Salesforce", "Pipedrive", "Freshworks", "SugarCRM"),
+    
+    # Marketing Automation
+    "marketo": ("HubSpot", "Pardot", "ActiveCampaign", "Mailchimp", "Constant Contact"),
+    "pardot": ("Marketo", "HubSpot", "ActiveCampaign", "Eloqua", "Act-On"),
+    "mailchimp": ("Constant Contact", "ActiveCampaign", "ConvertKit", "AWeber", "GetResponse"),
+    
+    # Data & Analytics
+    "zoominfo": ("Apollo", "LinkedIn Sales Navigator", "Clearbit", "DiscoverOrg", "InsideView"),
+    "clearbit": ("ZoomInfo", "Apollo", "FullContact", "Pipl", "DataSift"),
+    
+    # Communication Tools
+    "slack": ("Microsoft Teams", "Discord", "Zoom", "Google Workspace", "Cisco Webex"),
+    "zoom": ("Microsoft Teams", "Google Meet", "Slack", "GoToMeeting", "Cisco Webex"),
+    "teams": ("Slack", "Zoom", "Google Workspace", "Discord", "Cisco Webex"),
+    
+    # Project Management
+    "asana": ("Monday.com", "Trello", "Notion", "ClickUp", "Jira"),
+    "monday": ("Asana", "Trello", "Notion", "ClickUp", "Smartsheet"),
+    "notion": ("Asana", "Monday.com", "Airtable", "ClickUp", "Coda"),
+    
+    # E-commerce
+    "shopify": ("WooCommerce", "BigCommerce", "Magento", "Squarespace", "Wix"),
+    "woocommerce": ("Shopify", "BigCommerce", "Magento", "PrestaShop"),
+    
+    # Analytics
+    "mixpanel": ("Amplitude", "Google Analytics", "Adobe Analytics", "Heap", "Segment"),
+    "amplitude": ("Mixpanel", "Google Analytics", "Adobe Analytics", "Heap"),
+    
+    # Development Tools
+    "github": ("GitLab", "Bitbucket", "Azure DevOps", "SourceForge"),
+    "gitlab": ("GitHub", "Bitbucket", "Azure DevOps", "Gitea"),
+    
+    # Cloud Services
+    "aws": ("Microsoft Azure", "Google Cloud Platform", "IBM Cloud", "DigitalOcean"),
+    "azure": ("AWS", "Google Cloud Platform", "IBM Cloud", "Oracle Cloud"),
+    "gcp": ("AWS", "Microsoft Azure", "IBM Cloud", "Alibaba Cloud")
+}
+
+_MOCK_KEYS: Final[Tuple[str, ...]] = tuple(_MOCK_RESULTS)
+
+# Industry keyword fallbacks used when no company matches
+_INDUSTRY_KEYWORDS: Final[Dict[str, Tuple[str, ...]]] = {
+    "crm": ("HubSpot", "Salesforce", "Pipedrive", "Zoho CRM", "Freshsales"),
+    "sales": ("Outreach", "SalesLoft", "Apollo", "HubSpot", "Pipedrive"),
+    "marketing": ("HubSpot", "Marketo", "Pardot", "ActiveCampaign", "Mailchimp"),
+    "email": ("Lemlist", "Outreach", "Mailchimp", "ActiveCampaign", "ConvertKit"),
+    "analytics": ("Google Analytics", "Mixpanel", "Amplitude", "Adobe Analytics"),
+    "cloud": ("AWS", "Microsoft Azure", "Google Cloud Platform", "IBM Cloud"),
+    "communication": ("Slack", "Microsoft Teams", "Zoom", "Discord"),
+    "ecommerce": ("Shopify", "WooCommerce", "BigCommerce", "Magento")
+}
+
 
 class CompetitorDiscoveryAgent:
-    def __init__(self, openrouter_api_key: str):
+    def __init__(self,
+                 openrouter_api_key: str,
+                 db: Optional[DatabaseManager] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         self.openrouter_api_key = openrouter_api_key
         self.base_url = "https://openrouter.ai/api/v1"
+        self.db = db
+        
+        # (seed, max_competitors) -> (monotonic timestamp, competitors)
+        self._llm_cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self.cache_stats: Counter = Counter()
+        
+        # Shared pooled client so repeat calls skip the TCP+TLS handshake;
+        # an injected transport shares its connection pool with other agents,
+        # otherwise the agent builds its own HTTP/2 pool
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=15.0)
+            )
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=transport,
+            headers={
+                "Authorization": f"Bearer {self.openrouter_api_key}",
+                "Content-Type": "application/json"
+            },
+            # Fail fast on unreachable hosts while still allowing slow completions
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self.client.aclose()
         
     async def discover_competitors(self, seed_company: str, max_competitors: int = 10) -> List[str]:
         """Discover competitors using LLM and web search"""
         competitors = []
         
-        # Use LLM to generate potential competitors
-        llm_competitors = await self._get_competitors_from_llm(seed_company, max_competitors)
-        competitors.extend(llm_competitors)
+        # Query the LLM and web search concurrently; they share no data
+        llm_competitors, search_competitors = await asyncio.gather(
+            self._get_competitors_from_llm(seed_company, max_competitors),
+            self._search_competitors_web(seed_company),
+            return_exceptions=True
+        )
         
-        # Use web search to find more competitors
-        search_competitors = await self._search_competitors_web(seed_company)
-        competitors.extend(search_competitors)
+        for result in (llm_competitors, search_competitors):
+            if isinstance(result, Exception):
+                print(f"Error discovering competitors for {seed_company}: {result}")
+                continue
+            competitors.extend(result)
         
-        # Remove duplicates and limit results
-        unique_competitors = list(set(competitors))
+        # Remove duplicates (keeping the LLM's ranking order) and limit results
+        unique_competitors = list(dict.fromkeys(competitors))
         return unique_competitors[:max_competitors]
     
     async def _get_competitors_from_llm(self, seed_company: str, max_competitors: int) -> List[str]:
+        """Use LLM to identify competitors, serving repeat queries from cache"""
+        key = (seed_company.lower().strip(), max_competitors)
+        
+        # In-process cache first
+        cached = self._llm_cache.get(key)
+        if cached and time.monotonic() - cached[0] < LLM_CACHE_TTL_SECONDS:
+            self.cache_stats["hits"] += 1
+            return list(cached[1])
+        
+        # Then the persisted cache, which survives restarts
+        if self.db:
+            competitors = await asyncio.to_thread(
+                self.db.get_cached_competitors, key[0], max_competitors, LLM_CACHE_TTL_SECONDS
+            )
+            if competitors:
+                self.cache_stats["hits"] += 1
+                self._llm_cache[key] = (time.monotonic(), competitors)
+                return list(competitors)
+        
+        self.cache_stats["misses"] += 1
+        competitors = await self._fetch_competitors_from_llm(seed_company, max_competitors)
+        
+        # Empty results usually mean the call failed, so don't cache them
+        if competitors:
+            self._llm_cache[key] = (time.monotonic(), competitors)
+            if self.db:
+                await asyncio.to_thread(self.db.save_cached_competitors, key[0], max_competitors, competitors)
+        
+        return list(competitors)
+    
+    async def _fetch_competitors_from_llm(self, seed_company: str, max_competitors: int) -> List[str]:
         """Use LLM to identify competitors"""
         prompt = f"""
         Given the company "{seed_company}", please provide a list of {max_competitors} direct competitors.
@@ -46,42 +189,31 @@ class CompetitorDiscoveryAgent:
         """
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.openrouter_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "anthropic/claude-3-haiku",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 1000,
-                        "temperature": 0.7
-                    },
-                    timeout=30.0
-                )
+            response = await self.client.post(
+                "/chat/completions",
+                json={
+                    "model": "anthropic/claude-3-haiku",
+                    "messages": [
+                        {"role": "user", "content": prompt}
+                    ],
+                    "max_tokens": 1000,
+                    "temperature": 0.7
+                }
+            )
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                content = data["choices"][0]["message"]["content"]
+                
+                # Extract company names from response, skipping bullets and
+                # stripping any leading numbering
+                seed_lower = seed_company.lower()
+                lines = (line.strip() for line in content.split('\n'))
+                names = (_NUM_PREFIX_RE.sub('', line).strip() for line in lines if line and line[0] not in '-*')
+                competitors = [name for name in names if name and name.lower() != seed_lower]
+                
+                return competitors[:max_competitors]
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    content = data["choices"][0]["message"]["content"]
-                    
-                    # Extract company names from response
-                    lines = content.strip().split('\n')
-                    competitors = []
-                    for line in lines:
-                        line = line.strip()
-                        if line and not line.startswith('-') and not line.startswith('*'):
-                            # Clean up the line to extract just the company name
-                            company_name = re.sub(r'^\d+\.\s*', '', line)  # Remove numbering
-                            company_name = company_name.strip()
-                            if company_name and company_name.lower() != seed_company.lower():
-                                competitors.append(company_name)
-                    
-                    return competitors[:max_competitors]
-                    
         except Exception as e:
             print(f"Error getting competitors from LLM: {e}")
             
@@ -92,108 +224,41 @@ class CompetitorDiscoveryAgent:
         competitors = []
         
         try:
-            search_queries = [
-                f"{seed_company} competitors",
-                f"{seed_company} alternatives",
-                f"companies like {seed_company}"
-            ]
+            # Use a simple web search (you might want to use Google Custom Search API)
+            # For now, we'll use a mock implementation. The mock ignores the query
+            # text, so one call covers every query variant; a real search should
+            # gather "<seed> competitors", "<seed> alternatives" and
+            # "companies like <seed>" concurrently.
+            mock_competitors = await self._mock_web_search(seed_company)
+            competitors.extend(mock_competitors)
             
-            async with httpx.AsyncClient() as client:
-                for query in search_queries:
-                    try:
-                        # Use a simple web search (you might want to use Google Custom Search API)
-                        # For now, we'll use a mock implementation
-                        mock_competitors = await self._mock_web_search(seed_company)
-                        competitors.extend(mock_competitors)
-                    except Exception as e:
-                        print(f"Error in web search for {query}: {e}")
-                        continue
-                        
         except Exception as e:
             print(f"Error in web search: {e}")
             
-        return list(set(competitors))
+        return list(dict.fromkeys(competitors))
     
     async def _mock_web_search(self, seed_company: str) -> List[str]:
         """Mock web search results with realistic competitors based on industry patterns"""
-        # Comprehensive competitor database organized by company and industry
-        mock_results = {
-            # Sales & Marketing Tools
-            "apollo": ["Outreach", "SalesLoft", "HubSpot", "Pipedrive", "Salesforce", "ZoomInfo", "LinkedIn Sales Navigator"],
-            "lemlist": ["Outreach", "Reply.io", "Woodpecker", "Mailshake", "QuickMail", "SalesLoft", "Klenty"],
-            "outreach": ["Apollo", "SalesLoft", "Lemlist", "HubSpot", "Pipedrive", "Reply.io"],
-            "salesloft": ["Outreach", "Apollo", "HubSpot", "Pipedrive", "Lemlist", "Groove"],
-            "mailshake": ["Lemlist", "Outreach", "Reply.io", "Woodpecker", "QuickMail", "Klenty"],
-            
-            # CRM Platforms
-            "salesforce": ["HubSpot", "Pipedrive", "Microsoft Dynamics 365", "Zoho CRM", "Oracle Sales Cloud", "SugarCRM"],
-            "hubspot": ["Salesforce", "Pipedrive", "Zoho CRM", "ActiveCampaign", "Marketo", "Pardot"],
-            "pipedrive": ["HubSpot", "Salesforce", "Zoho CRM", "Freshsales", "Close", "Copper"],
-            "zoho": ["HubSpot", "Salesforce", "Pipedrive", "Freshworks", "SugarCRM"],
-            
-            # Marketing Automation
-            "marketo": ["HubSpot", "Pardot", "ActiveCampaign", "Mailchimp", "Constant Contact"],
-            "pardot": ["Marketo", "HubSpot", "ActiveCampaign", "Eloqua", "Act-On"],
-            "mailchimp": ["Constant Contact", "ActiveCampaign", "ConvertKit", "AWeber", "GetResponse"],
-            
-            # Data & Analytics
-            "zoominfo": ["Apollo", "LinkedIn Sales Navigator", "Clearbit", "DiscoverOrg", "InsideView"],
-            "clearbit": ["ZoomInfo", "Apollo", "FullContact", "Pipl", "DataSift"],
-            
-            # Communication Tools
-            "slack": ["Microsoft Teams", "Discord", "Zoom", "Google Workspace", "Cisco Webex"],
-            "zoom": ["Microsoft Teams", "Google Meet", "Slack", "GoToMeeting", "Cisco Webex"],
-            "teams": ["Slack", "Zoom", "Google Workspace", "Discord", "Cisco Webex"],
-            
-            # Project Management
-            "asana": ["Monday.com", "Trello", "Notion", "ClickUp", "Jira"],
-            "monday": ["Asana", "Trello", "Notion", "ClickUp", "Smartsheet"],
-            "notion": ["Asana", "Monday.com", "Airtable", "ClickUp", "Coda"],
-            
-            # E-commerce
-            "shopify": ["WooCommerce", "BigCommerce", "Magento", "Squarespace", "Wix"],
-            "woocommerce": ["Shopify", "BigCommerce", "Magento", "PrestaShop"],
-            
-            # Analytics
-            "mixpanel": ["Amplitude", "Google Analytics", "Adobe Analytics", "Heap", "Segment"],
-            "amplitude": ["Mixpanel", "Google Analytics", "Adobe Analytics", "Heap"],
-            
-            # Development Tools
-            "github": ["GitLab", "Bitbucket", "Azure DevOps", "SourceForge"],
-            "gitlab": ["GitHub", "Bitbucket", "Azure DevOps", "Gitea"],
-            
-            # Cloud Services
-            "aws": ["Microsoft Azure", "Google Cloud Platform", "IBM Cloud", "DigitalOcean"],
-            "azure": ["AWS", "Google Cloud Platform", "IBM Cloud", "Oracle Cloud"],
-            "gcp": ["AWS", "Microsoft Azure", "IBM Cloud", "Alibaba Cloud"]
-        }
-        
         seed_lower = seed_company.lower().strip()
         
-        # Direct match
-        if seed_lower in mock_results:
-            return mock_results[seed_lower]
+        # An empty seed is a substring of every key, so it would match anything
+        if not seed_lower:
+            return []
+        
+        # Direct match (single hash lookup)
+        competitors = _MOCK_RESULTS.get(seed_lower)
+        if competitors is not None:
+            return list(competitors)
         
         # Partial match
-        for key, competitors in mock_results.items():
+        for key in _MOCK_KEYS:
             if key in seed_lower or seed_lower in key:
-                return competitors
+                return list(_MOCK_RESULTS[key])
         
         # If no match found, try to infer from industry keywords
-        industry_keywords = {
-            "crm": ["HubSpot", "Salesforce", "Pipedrive", "Zoho CRM", "Freshsales"],
-            "sales": ["Outreach", "SalesLoft", "Apollo", "HubSpot", "Pipedrive"],
-            "marketing": ["HubSpot", "Marketo", "Pardot", "ActiveCampaign", "Mailchimp"],
-            "email": ["Lemlist", "Outreach", "Mailchimp", "ActiveCampaign", "ConvertKit"],
-            "analytics": ["Google Analytics", "Mixpanel", "Amplitude", "Adobe Analytics"],
-            "cloud": ["AWS", "Microsoft Azure", "Google Cloud Platform", "IBM Cloud"],
-            "communication": ["Slack", "Microsoft Teams", "Zoom", "Discord"],
-            "ecommerce": ["Shopify", "WooCommerce", "BigCommerce", "Magento"]
-        }
-        
-        for keyword, competitors in industry_keywords.items():
+        for keyword, competitors in _INDUSTRY_KEYWORDS.items():
             if keyword in seed_lower:
-                return competitors
+                return list(competitors)
         
         # If still no match, return empty list instead of generic competitors
         return []
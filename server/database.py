@@ -1,232 +1,622 @@
 import sqlite3
+import asyncio
 import json
-from typing import List, Optional
-from models import CompanyProfile, LeadProfile, AgentStatus
-from datetime import datetime
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Tuple
+from models import CompanyProfile, LeadProfile, AgentStatus, utc_now
+from embedding_cache import VECTOR_PROFILES
+
+# Explicit column lists so rows map onto model fields by name
+_COMPANY_COLUMNS = (
+    "name, domain, description, industry, size, location, founded, funding, "
+    "employees_count, linkedin_url, website"
+)
+_LEAD_COLUMNS = "name, title, company, email, linkedin_url, phone, location, department, seniority"
+
+# Statements are kept as constants so the connection's statement cache
+# sees identical SQL text on every call and reuses the prepared statement
+# Upsert keeps the existing row id on conflict, unlike INSERT OR REPLACE
+_SQL_UPSERT_COMPANY = f"""
+    INSERT INTO companies ({_COMPANY_COLUMNS}, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        domain = excluded.domain,
+        description = excluded.description,
+        industry = excluded.industry,
+        size = excluded.size,
+        location = excluded.location,
+        founded = excluded.founded,
+        funding = excluded.funding,
+        employees_count = excluded.employees_count,
+        linkedin_url = excluded.linkedin_url,
+        website = excluded.website,
+        updated_at = excluded.updated_at
+    RETURNING id
+"""
+
+_SQL_INSERT_LEAD = f"""
+    INSERT INTO leads ({_LEAD_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_GET_COMPANY = f"SELECT {_COMPANY_COLUMNS} FROM companies WHERE name = ?"
+_SQL_GET_ALL_COMPANIES = f"SELECT {_COMPANY_COLUMNS} FROM companies"
+_SQL_GET_LEADS_BY_COMPANY = f"SELECT {_LEAD_COLUMNS} FROM leads WHERE company = ?"
+
+# created_at is only written on insert, so it keeps the task's creation time
+_SQL_UPSERT_AGENT_STATUS = """
+    INSERT INTO agent_status
+    (agent_id, status, company, progress, message, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(agent_id) DO UPDATE SET
+        status = excluded.status,
+        company = excluded.company,
+        progress = excluded.progress,
+        message = excluded.message,
+        updated_at = excluded.updated_at
+"""
+
+_SQL_GET_AGENT_STATUS = """
+    SELECT agent_id, company, status, progress, message, created_at
+    FROM agent_status WHERE agent_id = ?
+"""
+
+_SQL_INSERT_EMBEDDING = """
+    INSERT INTO embeddings (content_type, content_id, content, embedding, dtype)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+_SQL_GET_CACHED_COMPETITORS = """
+    SELECT competitors FROM competitor_cache
+    WHERE seed_company = ? AND max_competitors = ? AND cached_at >= ?
+"""
+
+_SQL_SAVE_CACHED_COMPETITORS = """
+    INSERT OR REPLACE INTO competitor_cache
+    (seed_company, max_competitors, competitors, cached_at)
+    VALUES (?, ?, ?, ?)
+"""
+
+_SQL_GET_CACHED_COMPANY_CONTEXT = """
+    SELECT context FROM company_context_cache
+    WHERE company = ? AND cached_at >= ?
+"""
+
+_SQL_SAVE_CACHED_COMPANY_CONTEXT = """
+    INSERT OR REPLACE INTO company_context_cache (company, context, cached_at)
+    VALUES (?, ?, ?)
+"""
+
+_SQL_GET_CACHED_RESPONSE = "SELECT body, cached_at FROM response_cache WHERE key = ?"
+
+_SQL_SAVE_CACHED_RESPONSE = """
+    INSERT OR REPLACE INTO response_cache (key, body, cached_at)
+    VALUES (?, ?, ?)
+"""
+
+# Companies go through the trigram FTS index, which matches substrings just
+# like the LIKE scan used for leads
+_SQL_SEARCH = """
+    SELECT 'company' AS type, c.name, c.description, c.industry, c.location
+    FROM companies_fts
+    JOIN companies c ON c.id = companies_fts.rowid
+    WHERE companies_fts MATCH :fts
+    UNION ALL
+    SELECT 'lead', name, title, company, department
+    FROM leads
+    WHERE name LIKE :like OR title LIKE :like OR company LIKE :like OR department LIKE :like
+"""
+
+# Queries shorter than one trigram can't use the index, so companies fall back
+# to a LIKE scan
+_SQL_SEARCH_LIKE = """
+    SELECT 'company' AS type, name, description, industry, location
+    FROM companies
+    WHERE name LIKE :like OR description LIKE :like OR industry LIKE :like
+    UNION ALL
+    SELECT 'lead', name, title, company, department
+    FROM leads
+    WHERE name LIKE :like OR title LIKE :like OR company LIKE :like OR department LIKE :like
+"""
+
+# Shortest query the trigram tokenizer can match
+_FTS_MIN_QUERY_LENGTH = 3
+
+# Prepared statements kept per connection; comfortably above the number of
+# distinct statements above
+_STATEMENT_CACHE_SIZE = 256
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "leads.db"):
+    def __init__(self, db_path: str = "leads.db", vector_profile: str = "recall"):
         self.db_path = db_path
+        self._vector_dtype = np.dtype(VECTOR_PROFILES[vector_profile])
+        
+        # One long-lived connection shared across calls; autocommit mode so
+        # bulk writes can use explicit BEGIN/COMMIT
+        self._conn = sqlite3.connect(
+            db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=_STATEMENT_CACHE_SIZE
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-64000;
+            PRAGMA recursive_triggers=ON;
+        """)
+        
+        # Pending agent status rows, flushed in batches by flush_agent_status;
+        # created_at and updated_at are UTC ISO strings
+        self._agent_status: Dict[str, Tuple[str, str, int, str, str, str]] = {}
+        self._agent_status_lock = threading.Lock()
+        # Held across swap and write so flushes commit in the order they swapped
+        self._agent_status_flush_lock = threading.Lock()
+        
         self.init_database()
     
+    @contextmanager
+    def _cursor(self):
+        """Yield a cursor on the shared connection while holding the lock"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+    
+    @contextmanager
+    def _transaction(self, mode: str = "DEFERRED"):
+        """Yield a cursor inside an explicit BEGIN/COMMIT block"""
+        with self._cursor() as cursor:
+            cursor.execute(f"BEGIN {mode}")
+            try:
+                yield cursor
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+    
+    def close(self):
+        """Close the shared connection"""
+        with self._lock:
+            self._conn.close()
+    
     def init_database(self):
         """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Companies table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS companies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                domain TEXT,
-                description TEXT,
-                industry TEXT,
-                size TEXT,
-                location TEXT,
-                founded TEXT,
-                funding TEXT,
-                employees_count INTEGER,
-                linkedin_url TEXT,
-                website TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        with self._transaction() as cursor:
+            # Companies table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS companies (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    domain TEXT,
+                    description TEXT,
+                    industry TEXT,
+                    size TEXT,
+                    location TEXT,
+                    founded TEXT,
+                    funding TEXT,
+                    employees_count INTEGER,
+                    linkedin_url TEXT,
+                    website TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at REAL
+                )
+            """)
+            
+            # Databases created before refreshes were timestamped
+            cursor.execute("PRAGMA table_info(companies)")
+            if "updated_at" not in {row["name"] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE companies ADD COLUMN updated_at REAL")
         
-        # Leads table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS leads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                title TEXT,
-                company TEXT NOT NULL,
-                email TEXT,
-                linkedin_url TEXT,
-                phone TEXT,
-                location TEXT,
-                department TEXT,
-                seniority TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            # Leads table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS leads (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    title TEXT,
+                    company TEXT NOT NULL,
+                    email TEXT,
+                    linkedin_url TEXT,
+                    phone TEXT,
+                    location TEXT,
+                    department TEXT,
+                    seniority TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
         
-        # Agent status table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS agent_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id TEXT UNIQUE NOT NULL,
-                status TEXT NOT NULL,
-                company TEXT NOT NULL,
-                progress INTEGER DEFAULT 0,
-                message TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            # Agent status table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS agent_status (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    agent_id TEXT UNIQUE NOT NULL,
+                    status TEXT NOT NULL,
+                    company TEXT NOT NULL,
+                    progress INTEGER DEFAULT 0,
+                    message TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
         
-        # Embeddings table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS embeddings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content_type TEXT NOT NULL,
-                content_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                embedding BLOB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            # Embeddings table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content_type TEXT NOT NULL,
+                    content_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    embedding BLOB,
+                    dtype TEXT NOT NULL DEFAULT 'float32',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Databases created before vectors could be stored at reduced precision
+            cursor.execute("PRAGMA table_info(embeddings)")
+            if "dtype" not in {row["name"] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+        
+            # Cached LLM competitor lists
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS competitor_cache (
+                    seed_company TEXT NOT NULL,
+                    max_competitors INTEGER NOT NULL,
+                    competitors TEXT NOT NULL,
+                    cached_at REAL NOT NULL,
+                    PRIMARY KEY (seed_company, max_competitors)
+                )
+            """)
+            
+            # Cached upstream API response bodies, kept past expiry as a stale fallback
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    cached_at REAL NOT NULL
+                )
+            """)
+            
+            # Cached LLM company context summaries
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS company_context_cache (
+                    company TEXT PRIMARY KEY,
+                    context TEXT NOT NULL,
+                    cached_at REAL NOT NULL
+                )
+            """)
         
-        conn.commit()
-        conn.close()
+            # Lookup indexes (companies.name and agent_status.agent_id are
+            # already covered by their UNIQUE constraints)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_company ON leads(company)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_companies_industry ON companies(industry)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_companies_updated_at ON companies(updated_at)")
+        
+            # Full-text index over companies, kept in sync by triggers; the
+            # trigram tokenizer makes MATCH a substring search
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'companies_fts'")
+            row = cursor.fetchone()
+            fts_exists = row is not None and "trigram" in row[0]
+            if row is not None and not fts_exists:
+                # Built with the old word tokenizer; recreate and reindex
+                cursor.execute("DROP TABLE companies_fts")
+            
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS companies_fts USING fts5(
+                    name, description, industry,
+                    content='companies', content_rowid='id',
+                    tokenize='trigram'
+                )
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS companies_fts_ai AFTER INSERT ON companies BEGIN
+                    INSERT INTO companies_fts(rowid, name, description, industry)
+                    VALUES (new.id, new.name, new.description, new.industry);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS companies_fts_ad AFTER DELETE ON companies BEGIN
+                    INSERT INTO companies_fts(companies_fts, rowid, name, description, industry)
+                    VALUES ('delete', old.id, old.name, old.description, old.industry);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS companies_fts_au AFTER UPDATE ON companies BEGIN
+                    INSERT INTO companies_fts(companies_fts, rowid, name, description, industry)
+                    VALUES ('delete', old.id, old.name, old.description, old.industry);
+                    INSERT INTO companies_fts(rowid, name, description, industry)
+                    VALUES (new.id, new.name, new.description, new.industry);
+                END
+            """)
+            
+            # Index rows that existed before the FTS table was (re)built
+            if not fts_exists:
+                cursor.execute("INSERT INTO companies_fts(companies_fts) VALUES ('rebuild')")
     
     def save_company(self, company: CompanyProfile) -> int:
         """Save company profile to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO companies 
-            (name, domain, description, industry, size, location, founded, funding, 
-             employees_count, linkedin_url, website)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            company.name, company.domain, company.description, company.industry,
-            company.size, company.location, company.founded, company.funding,
-            company.employees_count, company.linkedin_url, company.website
-        ))
-        
-        company_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return company_id
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_UPSERT_COMPANY, (
+                company.name, company.domain, company.description, company.industry,
+                company.size, company.location, company.founded, company.funding,
+                company.employees_count, company.linkedin_url, company.website,
+                time.time()
+            ))
+            
+            return cursor.fetchone()[0]
     
     def save_lead(self, lead: LeadProfile) -> int:
         """Save lead profile to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO leads 
-            (name, title, company, email, linkedin_url, phone, location, department, seniority)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            lead.name, lead.title, lead.company, lead.email, lead.linkedin_url,
-            lead.phone, lead.location, lead.department, lead.seniority
-        ))
-        
-        lead_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return lead_id
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_INSERT_LEAD, (
+                lead.name, lead.title, lead.company, lead.email, lead.linkedin_url,
+                lead.phone, lead.location, lead.department, lead.seniority
+            ))
+            
+            return cursor.lastrowid
+    
+    def save_leads(self, leads: List[LeadProfile]) -> List[int]:
+        """Save multiple lead profiles in a single transaction"""
+        if not leads:
+            return []
+        
+        with self._transaction("IMMEDIATE") as cursor:
+            return self._insert_leads(cursor, leads)
+    
+    def save_company_with_leads(self, company: CompanyProfile, leads: List[LeadProfile]) -> Tuple[int, List[int]]:
+        """Save a company and its leads in one transaction"""
+        with self._transaction("IMMEDIATE") as cursor:
+            cursor.execute(_SQL_UPSERT_COMPANY, (
+                company.name, company.domain, company.description, company.industry,
+                company.size, company.location, company.founded, company.funding,
+                company.employees_count, company.linkedin_url, company.website,
+                time.time()
+            ))
+            company_id = cursor.fetchone()[0]
+            lead_ids = self._insert_leads(cursor, leads) if leads else []
+        
+        return company_id, lead_ids
+    
+    def _insert_leads(self, cursor: sqlite3.Cursor, leads: List[LeadProfile]) -> List[int]:
+        """Bulk-insert leads on an open write transaction and return their ids"""
+        cursor.executemany(_SQL_INSERT_LEAD, [
+            (
+                lead.name, lead.title, lead.company, lead.email, lead.linkedin_url,
+                lead.phone, lead.location, lead.department, lead.seniority
+            )
+            for lead in leads
+        ])
+        
+        # Rows from one write transaction get consecutive ids
+        cursor.execute("SELECT last_insert_rowid()")
+        last_id = cursor.fetchone()[0]
+        return list(range(last_id - len(leads) + 1, last_id + 1))
+    
+    def get_recently_updated_companies(self, max_age: float) -> List[str]:
+        """Names of companies whose profile was saved within max_age seconds"""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT name FROM companies WHERE updated_at >= ?", (time.time() - max_age,))
+            return [row["name"] for row in cursor.fetchall()]
     
     def get_company(self, name: str) -> Optional[CompanyProfile]:
         """Get company by name"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM companies WHERE name = ?", (name,))
-        row = cursor.fetchone()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_COMPANY, (name,))
+            row = cursor.fetchone()
         
         if row:
-            return CompanyProfile(
-                name=row[1], domain=row[2], description=row[3], industry=row[4],
-                size=row[5], location=row[6], founded=row[7], funding=row[8],
-                employees_count=row[9], linkedin_url=row[10], website=row[11]
-            )
+            return CompanyProfile(**dict(row))
         return None
     
     def get_leads_by_company(self, company_name: str) -> List[LeadProfile]:
         """Get all leads for a company"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM leads WHERE company = ?", (company_name,))
-        rows = cursor.fetchall()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_LEADS_BY_COMPANY, (company_name,))
+            rows = cursor.fetchall()
         
-        leads = []
-        for row in rows:
-            lead = LeadProfile(
-                name=row[1], title=row[2], company=row[3], email=row[4],
-                linkedin_url=row[5], phone=row[6], location=row[7],
-                department=row[8], seniority=row[9]
+        return [LeadProfile(**dict(row)) for row in rows]
+    
+    def update_agent_status(self, agent_id: str, status: str, progress: int, message: str,
+                            company: str = "", created_at: Optional[str] = None):
+        """Record agent status in memory; terminal states are written through immediately"""
+        updated_at = utc_now().isoformat()
+        with self._agent_status_lock:
+            self._agent_status[agent_id] = (
+                status, company, progress, message, created_at or updated_at, updated_at
             )
-            leads.append(lead)
         
-        return leads
+        if status in ("completed", "failed"):
+            self.flush_agent_status()
     
-    def update_agent_status(self, agent_id: str, status: str, progress: int, message: str):
-        """Update agent status"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def flush_agent_status(self):
+        """Write all pending agent status updates in one transaction"""
+        with self._agent_status_flush_lock:
+            with self._agent_status_lock:
+                pending, self._agent_status = self._agent_status, {}
+            
+            if not pending:
+                return
+            
+            try:
+                with self._transaction() as cursor:
+                    cursor.executemany(_SQL_UPSERT_AGENT_STATUS, [
+                        (agent_id, status, company, progress, message, created_at, updated_at)
+                        for agent_id, (status, company, progress, message, created_at, updated_at) in pending.items()
+                    ])
+            except Exception:
+                # Put the batch back for the next flush, unless newer updates arrived meanwhile
+                with self._agent_status_lock:
+                    for agent_id, entry in pending.items():
+                        self._agent_status.setdefault(agent_id, entry)
+                raise
+    
+    def get_agent_status(self, agent_id: str) -> Optional[Dict]:
+        """Last recorded status of an agent, including updates not yet flushed"""
+        with self._agent_status_lock:
+            pending = self._agent_status.get(agent_id)
+        if pending:
+            status, company, progress, message, created_at, _ = pending
+            return {
+                "agent_id": agent_id,
+                "company": company,
+                "status": status,
+                "progress": progress,
+                "message": message,
+                "created_at": created_at
+            }
         
-        cursor.execute("""
-            INSERT OR REPLACE INTO agent_status 
-            (agent_id, status, company, progress, message, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (agent_id, status, "", progress, message, datetime.now()))
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_AGENT_STATUS, (agent_id,))
+            row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    async def run_agent_status_flusher(self, interval: float = 5.0):
+        """Periodically flush pending agent status updates until cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self.flush_agent_status)
+        finally:
+            self.flush_agent_status()
+    
+    def get_cached_competitors(self, seed_company: str, max_competitors: int, max_age: float) -> Optional[List[str]]:
+        """Get a cached competitor list if it is younger than max_age seconds"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_CACHED_COMPETITORS, (seed_company, max_competitors, time.time() - max_age))
+            row = cursor.fetchone()
         
-        conn.commit()
-        conn.close()
+        return json.loads(row[0]) if row else None
     
-    def get_all_companies(self) -> List[CompanyProfile]:
-        """Get all companies"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def save_cached_competitors(self, seed_company: str, max_competitors: int, competitors: List[str]):
+        """Cache a competitor list for a seed company"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_SAVE_CACHED_COMPETITORS, (seed_company, max_competitors, json.dumps(competitors), time.time()))
+    
+    def get_cached_company_context(self, company: str, max_age: float) -> Optional[str]:
+        """Get a cached company context summary if it is younger than max_age seconds"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_CACHED_COMPANY_CONTEXT, (company, time.time() - max_age))
+            row = cursor.fetchone()
         
-        cursor.execute("SELECT * FROM companies")
-        rows = cursor.fetchall()
-        conn.close()
+        return row[0] if row else None
+    
+    def save_cached_company_context(self, company: str, context: str):
+        """Cache a company context summary"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_SAVE_CACHED_COMPANY_CONTEXT, (company, context, time.time()))
+    
+    def get_cached_response(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Get a cached response body and its timestamp, however old"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_CACHED_RESPONSE, (key,))
+            row = cursor.fetchone()
         
-        companies = []
-        for row in rows:
-            company = CompanyProfile(
-                name=row[1], domain=row[2], description=row[3], industry=row[4],
-                size=row[5], location=row[6], founded=row[7], funding=row[8],
-                employees_count=row[9], linkedin_url=row[10], website=row[11]
-            )
-            companies.append(company)
+        return (row[0], row[1]) if row else None
+    
+    def save_cached_response(self, key: str, body: bytes):
+        """Cache a response body under key"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_SAVE_CACHED_RESPONSE, (key, body, time.time()))
+    
+    def save_embeddings(self, content_type: str, items: List[Tuple[str, str, np.ndarray]]):
+        """Store (content_id, content, vector) items as raw bytes at the profile's precision"""
+        dtype = self._vector_dtype
+        with self._transaction() as cursor:
+            cursor.executemany(_SQL_INSERT_EMBEDDING, [
+                (content_type, content_id, content, np.ascontiguousarray(vector, dtype=dtype).tobytes(), dtype.name)
+                for content_id, content, vector in items
+            ])
+    
+    def load_embeddings(self, content_type: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+        """Load stored embeddings as content ids plus one (N, D) float32 matrix"""
+        with self._cursor() as cursor:
+            if content_type:
+                cursor.execute(
+                    "SELECT content_id, embedding, dtype FROM embeddings WHERE content_type = ? AND embedding IS NOT NULL",
+                    (content_type,)
+                )
+            else:
+                cursor.execute("SELECT content_id, embedding, dtype FROM embeddings WHERE embedding IS NOT NULL")
+            rows = cursor.fetchall()
+        
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
+        
+        ids = [row[0] for row in rows]
+        dtypes = {row[2] for row in rows}
+        if len(dtypes) == 1:
+            # All vectors share one dimensionality and precision, so the blobs
+            # decode as one buffer
+            matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=dtypes.pop())
+            return ids, matrix.reshape(len(rows), -1).astype(np.float32, copy=False)
+        
+        # Rows written under different profiles
+        return ids, np.stack([np.frombuffer(row[1], dtype=row[2]) for row in rows]).astype(np.float32)
+    
+    def search_embeddings(self, query: np.ndarray, content_type: Optional[str] = None, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return the top_k stored embeddings by cosine similarity to query"""
+        ids, matrix = self.load_embeddings(content_type)
+        if not ids:
+            return []
+        
+        query = np.asarray(query, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        scores = (matrix @ query) / np.where(norms == 0, 1, norms)
         
-        return companies
+        top = np.argsort(-scores)[:top_k]
+        return [(ids[i], float(scores[i])) for i in top]
+    
+    def get_all_companies(self) -> List[CompanyProfile]:
+        """Get all companies"""
+        with self._cursor() as cursor:
+            cursor.execute(_SQL_GET_ALL_COMPANIES)
+            rows = cursor.fetchall()
+        
+        return [CompanyProfile(**dict(row)) for row in rows]
+    
+    def get_company_lead_counts(self) -> Dict[str, int]:
+        """Number of stored leads per company, in one aggregate query"""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT company, COUNT(*) FROM leads GROUP BY company")
+            return dict(cursor.fetchall())
     
     def search_content(self, query: str) -> List[dict]:
         """Search content across companies and leads"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Search companies
-        cursor.execute("""
-            SELECT 'company' as type, name, description, industry, location 
-            FROM companies 
-            WHERE name LIKE ? OR description LIKE ? OR industry LIKE ?
-        """, (f"%{query}%", f"%{query}%", f"%{query}%"))
+        with self._cursor() as cursor:
+            sql = _SQL_SEARCH if len(query) >= _FTS_MIN_QUERY_LENGTH else _SQL_SEARCH_LIKE
+            cursor.execute(sql, {"fts": self._fts_query(query), "like": f"%{query}%"})
+            rows = cursor.fetchall()
         
         results = []
-        for row in cursor.fetchall():
-            results.append({
-                "type": row[0],
-                "name": row[1],
-                "description": row[2],
-                "industry": row[3],
-                "location": row[4]
-            })
-        
-        # Search leads
-        cursor.execute("""
-            SELECT 'lead' as type, name, title, company, department
-            FROM leads 
-            WHERE name LIKE ? OR title LIKE ? OR company LIKE ? OR department LIKE ?
-        """, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
-        
-        for row in cursor.fetchall():
-            results.append({
-                "type": row[0],
-                "name": row[1],
-                "title": row[2],
-                "company": row[3],
-                "department": row[4]
-            })
-        
-        conn.close()
+        for row in rows:
+            if row[0] == "company":
+                results.append({
+                    "type": row[0],
+                    "name": row[1],
+                    "description": row[2],
+                    "industry": row[3],
+                    "location": row[4]
+                })
+            else:
+                results.append({
+                    "type": row[0],
+                    "name": row[1],
+                    "title": row[2],
+                    "company": row[3],
+                    "department": row[4]
+                })
+        
         return results
+    
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Quote user input as a single FTS5 phrase, i.e. a substring match under trigram"""
+        return '"' + query.replace('"', '""') + '"'
@@ -1,120 +1,357 @@
 import json
+import time
+import asyncio
+import hashlib
+import functools
+import logging
+from collections import OrderedDict
+import orjson
 import numpy as np
-from typing import List, Dict, Any
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Callable, Awaitable
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 import httpx
 from models import CompanyProfile, LeadProfile
+from embedding_cache import EmbeddingCache, VECTOR_PROFILES
+
+logger = logging.getLogger(__name__)
+
+# Dynamically quantized INT8 export published alongside the model on the hub
+# (the AVX2 variant is quantized to unsigned int8, hence "quint8")
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+# HNSW graph parameters per index profile. Higher M / ef buy recall with
+# memory and latency: the graph costs roughly N*d*4 bytes for the vectors
+# plus N*M*8 bytes for the links, and search cost grows with search_ef
+INDEX_PROFILES = {
+    "recall": {"hnsw:M": 48, "hnsw:construction_ef": 400, "hnsw:search_ef": 256},
+    "balanced": {"hnsw:M": 32, "hnsw:construction_ef": 200, "hnsw:search_ef": 100},
+    "speed": {"hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 32},
+}
+
+# Documents encoded and upserted together when embedding a research session
+EMBED_BATCH_SIZE = 64
+# Slices encoded concurrently in worker threads; the model releases the GIL
+EMBED_MAX_IN_FLIGHT = 4
+
+# Semantic answer cache: near-duplicate questions reuse a recent answer
+ANSWER_CACHE_SIZE = 10_000
+ANSWER_CACHE_SIMILARITY = 0.97
+ANSWER_CACHE_TTL_SECONDS = 3600
+
+# Retrieval guesses: question prefix -> documents it last retrieved, used to
+# start the LLM call before the real search finishes
+RETRIEVAL_GUESS_SIZE = 1024
+RETRIEVAL_GUESS_PREFIX = 64
+
+def _retrieve_task_exception(task: asyncio.Task):
+    """Mark a possibly abandoned task's exception as retrieved so asyncio doesn't log it"""
+    if not task.cancelled():
+        task.exception()
 
 class EmbeddingAgent:
-    def __init__(self, openrouter_api_key: str, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self,
+                 openrouter_api_key: str,
+                 model_name: str = "all-MiniLM-L6-v2",
+                 backend: str = "onnx",
+                 index_profile: str = "balanced",
+                 vector_profile: str = "recall",
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         self.openrouter_api_key = openrouter_api_key
         self.openrouter_base_url = "https://openrouter.ai/api/v1"
-        self.embedding_model = SentenceTransformer(model_name)
+        self._autocast = nullcontext
+        self.embedding_model = self._load_embedding_model(model_name, backend)
+        
+        # Keyed by model and precision, since each produces slightly different vectors;
+        # the vector profile sets the precision every indexed vector is stored at
+        self.embedding_cache = EmbeddingCache(self._model_key, dtype=VECTOR_PROFILES[vector_profile])
+        
+        # Ring buffer of recent question embeddings and the answers given to them;
+        # the matrix is allocated on first use, once the embedding size is known
+        self._answer_vectors: Optional[np.ndarray] = None
+        self._answer_entries: List[Optional[tuple]] = [None] * ANSWER_CACHE_SIZE
+        self._answer_count = 0
+        self._answer_next = 0
+        self._retrieval_guesses: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        
+        # Shared pooled client so chat requests skip the TCP+TLS handshake;
+        # an injected transport shares its HTTP/2 connection pool with other agents,
+        # otherwise the agent builds its own
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        self.client = httpx.AsyncClient(
+            base_url=self.openrouter_base_url,
+            transport=transport,
+            headers={
+                "Authorization": f"Bearer {self.openrouter_api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
         
         # Initialize ChromaDB
         self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
+        # Embeddings are L2-normalized, so inner product equals cosine similarity
+        # without the per-comparison norms. Space and graph parameters only take
+        # effect when the collection is first created
         self.collection = self.chroma_client.get_or_create_collection(
             name="leads_and_companies",
-            metadata={"hnsw:space": "cosine"}
+            metadata={"hnsw:space": "ip", **INDEX_PROFILES[index_profile]}
+        )
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self.client.aclose()
+    
+    def _load_embedding_model(self, model_name: str, backend: str) -> SentenceTransformer:
+        """Load the embedding model, preferring INT8 ONNX Runtime over PyTorch"""
+        if backend == "onnx":
+            try:
+                model = SentenceTransformer(
+                    model_name,
+                    backend="onnx",
+                    model_kwargs={"file_name": ONNX_INT8_FILE}
+                )
+                self._model_key = f"{model_name}:onnx-int8"
+                return model
+            except Exception as e:
+                logger.warning("ONNX embedding backend unavailable, falling back to PyTorch: %s", e)
+        
+        model = SentenceTransformer(model_name)
+        self._model_key = f"{model_name}:torch"
+        self._enable_ipex_bf16(model)
+        return model
+    
+    def _enable_ipex_bf16(self, model: SentenceTransformer):
+        """Run the PyTorch model in BF16 via Intel Extension for PyTorch, when installed"""
+        try:
+            import torch
+            import intel_extension_for_pytorch as ipex
+        except ImportError:
+            return
+        
+        try:
+            auto_model = model._first_module().auto_model.eval()
+            ipex.optimize(auto_model, dtype=torch.bfloat16, inplace=True)
+            self._autocast = lambda: torch.autocast("cpu", dtype=torch.bfloat16)
+            self._model_key += "-bf16"
+        except Exception as e:
+            logger.warning("IPEX BF16 optimization failed, using FP32: %s", e)
+    
+    def _encode(self, texts, **kwargs) -> np.ndarray:
+        """Call the model's encode inside the active precision context"""
+        with self._autocast():
+            return self.embedding_model.encode(texts, **kwargs)
+    
+    def encode_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode many texts, reusing cached embeddings for texts seen before"""
+        return self.embedding_cache.get_or_compute(
+            texts,
+            lambda misses: self._encode_sorted(misses, batch_size)
+        )
+    
+    def _encode_sorted(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Encode many texts in length-sorted batches, returned in input order"""
+        # Similar-length neighbours share a batch, so little compute goes to padding
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        embeddings = self._encode(
+            [texts[i] for i in order],
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
         )
+        
+        # Scatter back to the caller's order
+        result = np.empty_like(embeddings)
+        result[order] = embeddings
+        return result
+    
+    async def _aencode(self, texts: List[str]) -> np.ndarray:
+        """encode_batch on a worker thread, keeping the event loop free"""
+        return await asyncio.to_thread(self.encode_batch, texts)
     
     def embed_company(self, company: CompanyProfile) -> str:
         """Embed company data and store in vector database"""
+        doc_ids = self.embed_multiple_companies([company])
+        return doc_ids[0] if doc_ids else ""
+    
+    def embed_lead(self, lead: LeadProfile) -> str:
+        """Embed lead data and store in vector database"""
+        doc_ids = self.embed_multiple_leads([lead])
+        return doc_ids[0] if doc_ids else ""
+    
+    def embed_multiple_companies(self, companies: List[CompanyProfile]) -> List[str]:
+        """Embed multiple companies with one encode and one upsert"""
+        if not companies:
+            return []
+        
         try:
-            # Create text representation of company
-            company_text = self._company_to_text(company)
-            
-            # Generate embedding
-            embedding = self.embedding_model.encode(company_text).tolist()
-            
-            # Store in ChromaDB
-            doc_id = f"company_{company.name.replace(' ', '_').lower()}"
-            
-            self.collection.upsert(
-                ids=[doc_id],
-                embeddings=[embedding],
-                documents=[company_text],
-                metadatas=[{
-                    "type": "company",
-                    "name": company.name,
-                    "industry": company.industry or "",
-                    "location": company.location or "",
-                    "size": company.size or ""
-                }]
-            )
-            
-            return doc_id
+            return self._upsert_documents([self._company_document(company) for company in companies])
             
         except Exception as e:
-            print(f"Error embedding company {company.name}: {e}")
-            return ""
+            print(f"Error embedding {len(companies)} companies: {e}")
+            return []
     
-    def embed_lead(self, lead: LeadProfile) -> str:
-        """Embed lead data and store in vector database"""
+    def embed_multiple_leads(self, leads: List[LeadProfile]) -> List[str]:
+        """Embed multiple leads with one encode and one upsert"""
+        if not leads:
+            return []
+        
         try:
-            # Create text representation of lead
-            lead_text = self._lead_to_text(lead)
-            
-            # Generate embedding
-            embedding = self.embedding_model.encode(lead_text).tolist()
-            
-            # Store in ChromaDB
-            doc_id = f"lead_{lead.name.replace(' ', '_').lower()}_{lead.company.replace(' ', '_').lower()}"
-            
-            self.collection.upsert(
-                ids=[doc_id],
-                embeddings=[embedding],
-                documents=[lead_text],
-                metadatas=[{
-                    "type": "lead",
-                    "name": lead.name,
-                    "title": lead.title or "",
-                    "company": lead.company,
-                    "department": lead.department or "",
-                    "seniority": lead.seniority or ""
-                }]
-            )
+            return self._upsert_documents([self._lead_document(lead) for lead in leads])
             
-            return doc_id
+        except Exception as e:
+            print(f"Error embedding {len(leads)} leads: {e}")
+            return []
+    
+    def embed_profiles(self, companies: List[CompanyProfile], leads: List[LeadProfile]) -> List[str]:
+        """Embed companies and leads together with one encode and one upsert"""
+        documents = self.profile_documents(companies, leads)
+        if not documents:
+            return []
+        
+        try:
+            return self._upsert_documents(documents)
             
         except Exception as e:
-            print(f"Error embedding lead {lead.name}: {e}")
-            return ""
+            print(f"Error embedding {len(companies)} companies and {len(leads)} leads: {e}")
+            return []
     
-    def embed_multiple_companies(self, companies: List[CompanyProfile]) -> List[str]:
-        """Embed multiple companies"""
+    def profile_documents(self, companies: List[CompanyProfile], leads: List[LeadProfile]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Build the documents for companies and leads without embedding them"""
+        documents = [self._company_document(company) for company in companies]
+        documents += [self._lead_document(lead) for lead in leads]
+        return documents
+    
+    def embed_batch(self, documents: List[Tuple[str, str, Dict[str, Any]]], batch_size: int = EMBED_BATCH_SIZE) -> List[str]:
+        """Embed documents collected across a session, one encode and upsert per slice"""
         doc_ids = []
-        for company in companies:
-            doc_id = self.embed_company(company)
-            if doc_id:
-                doc_ids.append(doc_id)
+        for batch in self._session_batches(documents, batch_size):
+            doc_ids.extend(self._embed_slice(batch))
         return doc_ids
     
-    def embed_multiple_leads(self, leads: List[LeadProfile]) -> List[str]:
-        """Embed multiple leads"""
+    async def aembed_batch(self,
+                           documents: List[Tuple[str, str, Dict[str, Any]]],
+                           batch_size: int = EMBED_BATCH_SIZE,
+                           max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+                           on_slice_done: Optional[Callable[[List[str]], Awaitable[None]]] = None) -> List[str]:
+        """Embed session documents with up to max_in_flight slices encoding at once;
+        on_slice_done receives each slice's document ids once it has been stored"""
+        batches = self._session_batches(documents, batch_size)
+        results: List[Optional[List[str]]] = [None] * len(batches)
+        semaphore = asyncio.Semaphore(max_in_flight)
+        
+        async def run(index: int, batch: List[Tuple[str, str, Dict[str, Any]]]):
+            async with semaphore:
+                results[index] = await asyncio.to_thread(self._embed_slice, batch)
+            if on_slice_done:
+                await on_slice_done([doc[0] for doc in batch])
+        
+        await asyncio.gather(*[run(i, batch) for i, batch in enumerate(batches)])
+        
+        # Reassemble in submission order
+        return [doc_id for batch_ids in results for doc_id in batch_ids]
+    
+    @staticmethod
+    def _session_batches(documents: List[Tuple[str, str, Dict[str, Any]]], batch_size: int) -> List[List[Tuple[str, str, Dict[str, Any]]]]:
+        """Dedupe documents by id and split them into batch_size slices"""
+        # Dedupe across the whole session so slices never race on an id
+        documents = list({doc[0]: doc for doc in documents}.values())
+        return [documents[start:start + batch_size] for start in range(0, len(documents), batch_size)]
+    
+    def _embed_slice(self, batch: List[Tuple[str, str, Dict[str, Any]]]) -> List[str]:
+        """Upsert one slice, retrying item by item if the slice fails"""
+        try:
+            return self._upsert_documents(batch)
+        except Exception as e:
+            # One bad document shouldn't sink the whole slice
+            print(f"Error embedding batch of {len(batch)} documents, retrying one by one: {e}")
+        
         doc_ids = []
-        for lead in leads:
-            doc_id = self.embed_lead(lead)
-            if doc_id:
-                doc_ids.append(doc_id)
+        for document in batch:
+            try:
+                doc_ids.extend(self._upsert_documents([document]))
+            except Exception as item_error:
+                print(f"Error embedding {document[0]}: {item_error}")
         return doc_ids
     
-    def search_similar(self, query: str, n_results: int = 10) -> Dict[str, Any]:
-        """Search for similar content based on query"""
+    def _company_document(self, company: CompanyProfile) -> Tuple[str, str, Dict[str, Any]]:
+        """Build the (doc_id, text, metadata) stored for a company"""
+        return (
+            f"company_{company.name.replace(' ', '_').lower()}",
+            self._company_to_text(company),
+            {
+                "type": "company",
+                "name": company.name,
+                "industry": company.industry or "",
+                "location": company.location or "",
+                "size": company.size or ""
+            }
+        )
+    
+    def _lead_document(self, lead: LeadProfile) -> Tuple[str, str, Dict[str, Any]]:
+        """Build the (doc_id, text, metadata) stored for a lead"""
+        return (
+            f"lead_{lead.name.replace(' ', '_').lower()}_{lead.company.replace(' ', '_').lower()}",
+            self._lead_to_text(lead),
+            {
+                "type": "lead",
+                "name": lead.name,
+                "title": lead.title or "",
+                "company": lead.company,
+                "department": lead.department or "",
+                "seniority": lead.seniority or ""
+            }
+        )
+    
+    def _upsert_documents(self, documents: List[Tuple[str, str, Dict[str, Any]]]) -> List[str]:
+        """Encode (doc_id, text, metadata) documents in one batch and store them with a single upsert"""
+        # Chroma rejects repeated ids within one upsert; keep the last
+        # occurrence, matching the old one-upsert-per-item behaviour
+        documents = list({doc_id: (doc_id, text, metadata) for doc_id, text, metadata in documents}.values())
+        doc_ids = [doc_id for doc_id, _, _ in documents]
+        texts = [text for _, text, _ in documents]
+        metadatas = [metadata for _, _, metadata in documents]
+        
+        # Generate embeddings in a single batch
+        embeddings = self.encode_batch(texts)
+        
+        # Store in ChromaDB
+        self.collection.upsert(
+            ids=doc_ids,
+            embeddings=embeddings.tolist(),
+            documents=texts,
+            metadatas=metadatas
+        )
+        
+        # Cached answers may no longer reflect the stored data
+        self._clear_answer_cache()
+        
+        return doc_ids
+    
+    def search_similar(self, query: str, n_results: int = 10, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Search for similar content based on query, optionally filtered on metadata"""
+        return self._search_with_embedding(self.encode_batch([query])[0], n_results, where)
+    
+    def _search_with_embedding(self, query_embedding: np.ndarray, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Search for content similar to an already-encoded query"""
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode(query).tolist()
-            
             # Search in ChromaDB
             results = self.collection.query(
-                query_embeddings=[query_embedding],
+                query_embeddings=[query_embedding.tolist()],
                 n_results=n_results,
+                where=where,
                 include=["documents", "metadatas", "distances"]
             )
             
             return {
+                "ids": results["ids"][0],
                 "documents": results["documents"][0],
                 "metadatas": results["metadatas"][0],
                 "distances": results["distances"][0]
@@ -122,13 +359,30 @@ class EmbeddingAgent:
             
         except Exception as e:
             print(f"Error searching similar content: {e}")
-            return {"documents": [], "metadatas": [], "distances": []}
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
     
     async def chat_with_data(self, question: str, context_limit: int = 5) -> Dict[str, Any]:
         """Chat with the embedded data using LLM"""
+        speculative = None
         try:
+            # Near-duplicate of a recent question: reuse its answer
+            query_embedding = (await self._aencode([question]))[0]
+            cached = self._lookup_cached_answer(query_embedding)
+            if cached:
+                return cached
+            
+            # Speculatively start the LLM on the documents this kind of question
+            # retrieved last time, while the real retrieval runs
+            guess_key = self._retrieval_guess_key(question)
+            guess = self._retrieval_guesses.get(guess_key)
+            if guess:
+                self._retrieval_guesses.move_to_end(guess_key)
+                speculative = asyncio.create_task(self._llm_with_context(question, guess["documents"]))
+                # A wrong guess is cancelled without being awaited; it may already have failed
+                speculative.add_done_callback(_retrieve_task_exception)
+            
             # Search for relevant context
-            search_results = self.search_similar(question, n_results=context_limit)
+            search_results = await asyncio.to_thread(self._search_with_embedding, query_embedding, context_limit)
             
             # Prepare context for LLM
             context_docs = search_results["documents"]
@@ -140,104 +394,206 @@ class EmbeddingAgent:
                     "sources": []
                 }
             
-            # Build context string
-            context_str = "\n\n".join([
-                f"Document {i+1}: {doc}" 
-                for i, doc in enumerate(context_docs)
-            ])
-            
-            # Create prompt for LLM
-            prompt = f"""
-            Based on the following information about companies and leads, please answer the user's question.
-            
-            Context:
-            {context_str}
-            
-            Question: {question}
-            
-            Please provide a helpful and accurate answer based only on the information provided in the context.
-            If the information is not available in the context, please say so.
-            """
-            
-            # Get answer from LLM
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.openrouter_base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.openrouter_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "anthropic/claude-3-haiku",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 1500,
-                        "temperature": 0.3
-                    },
-                    timeout=30.0
-                )
+            self._remember_retrieval(guess_key, search_results)
+            
+            # Keep the speculative answer only if it saw the same documents
+            if speculative and guess["ids"] == search_results["ids"]:
+                answer = await speculative
+            else:
+                # Wrong guess: stop paying for it before asking again
+                if speculative:
+                    speculative.cancel()
+                answer = await self._llm_with_context(question, context_docs)
+            
+            if answer is not None:
+                result = {
+                    "answer": answer,
+                    "sources": self._sources_from_metadata(context_metadata)
+                }
+                self._store_cached_answer(query_embedding, result)
+                return result
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    answer = data["choices"][0]["message"]["content"]
-                    
-                    # Extract source information
-                    sources = []
-                    for metadata in context_metadata:
-                        if metadata.get("type") == "company":
-                            sources.append(f"Company: {metadata.get('name', 'Unknown')}")
-                        elif metadata.get("type") == "lead":
-                            sources.append(f"Lead: {metadata.get('name', 'Unknown')} at {metadata.get('company', 'Unknown')}")
-                    
-                    return {
-                        "answer": answer,
-                        "sources": sources
-                    }
-                    
         except Exception as e:
             print(f"Error in chat: {e}")
+        
+        finally:
+            if speculative and not speculative.done():
+                speculative.cancel()
             
         return {
             "answer": "Sorry, I encountered an error while processing your question.",
             "sources": []
         }
     
+    async def stream_chat_with_data(self, question: str, context_limit: int = 5) -> AsyncIterator[Dict[str, Any]]:
+        """Chat with the embedded data, yielding the sources first and then answer text as it is generated"""
+        try:
+            # Near-duplicate of a recent question: replay its answer
+            query_embedding = (await self._aencode([question]))[0]
+            cached = self._lookup_cached_answer(query_embedding)
+            if cached:
+                yield {"sources": cached["sources"]}
+                yield {"delta": cached["answer"]}
+                return
+            
+            # Search for relevant context
+            search_results = await asyncio.to_thread(self._search_with_embedding, query_embedding, context_limit)
+            if not search_results["documents"]:
+                yield {"sources": []}
+                yield {"delta": "I don't have enough information to answer that question."}
+                return
+            
+            self._remember_retrieval(self._retrieval_guess_key(question), search_results)
+            sources = self._sources_from_metadata(search_results["metadatas"])
+            yield {"sources": sources}
+            
+            parts = []
+            async for delta in self._llm_stream(self._build_chat_prompt(question, search_results["documents"])):
+                parts.append(delta)
+                yield {"delta": delta}
+            
+            self._store_cached_answer(query_embedding, {"answer": "".join(parts), "sources": sources})
+            
+        except Exception as e:
+            print(f"Error in chat: {e}")
+            yield {"delta": "Sorry, I encountered an error while processing your question."}
+    
+    async def _llm_with_context(self, question: str, context_docs: List[str]) -> Optional[str]:
+        """Answer the question from the given documents, or None if the LLM call fails"""
+        try:
+            return "".join([delta async for delta in self._llm_stream(self._build_chat_prompt(question, context_docs))])
+        except httpx.HTTPStatusError:
+            return None
+    
+    async def _llm_stream(self, prompt: str, max_tokens: int = 1500, temperature: float = 0.3) -> AsyncIterator[str]:
+        """Stream completion text from the LLM as it is generated"""
+        async with self.client.stream(
+            "POST",
+            "/chat/completions",
+            json={
+                "model": "anthropic/claude-3-haiku",
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": True
+            },
+            timeout=30.0
+        ) as response:
+            response.raise_for_status()
+            
+            # Server-sent events; comment lines keep the connection alive
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                payload = line[6:]
+                if payload == "[DONE]":
+                    break
+                
+                choices = orjson.loads(payload).get("choices")
+                if choices:
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+    
+    def _build_chat_prompt(self, question: str, context_docs: List[str]) -> str:
+        """Prompt asking the LLM to answer from the given documents only"""
+        # Build context string
+        context_str = "\n\n".join([
+            f"Document {i+1}: {doc}" 
+            for i, doc in enumerate(context_docs)
+        ])
+        
+        return f"""
+        Based on the following information about companies and leads, please answer the user's question.
+        
+        Context:
+        {context_str}
+        
+        Question: {question}
+        
+        Please provide a helpful and accurate answer based only on the information provided in the context.
+        If the information is not available in the context, please say so.
+        """
+    
+    def _sources_from_metadata(self, metadatas: List[Dict[str, Any]]) -> List[str]:
+        """Describe the documents an answer was drawn from"""
+        sources = []
+        for metadata in metadatas:
+            if metadata.get("type") == "company":
+                sources.append(f"Company: {metadata.get('name', 'Unknown')}")
+            elif metadata.get("type") == "lead":
+                sources.append(f"Lead: {metadata.get('name', 'Unknown')} at {metadata.get('company', 'Unknown')}")
+        return sources
+    
+    @staticmethod
+    def _retrieval_guess_key(question: str) -> bytes:
+        """Hash of the normalized question prefix"""
+        normalized = " ".join(question.lower().split())[:RETRIEVAL_GUESS_PREFIX]
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+    
+    def _remember_retrieval(self, guess_key: bytes, search_results: Dict[str, Any]):
+        """Record what a question retrieved, evicting the least recently used entry"""
+        self._retrieval_guesses[guess_key] = {
+            "ids": search_results["ids"],
+            "documents": search_results["documents"]
+        }
+        self._retrieval_guesses.move_to_end(guess_key)
+        if len(self._retrieval_guesses) > RETRIEVAL_GUESS_SIZE:
+            self._retrieval_guesses.popitem(last=False)
+    
+    def _lookup_cached_answer(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return a fresh cached answer whose question is near-identical to this one"""
+        if not self._answer_count:
+            return None
+        
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        sims = self._answer_vectors[:self._answer_count] @ query_embedding
+        best = int(np.argmax(sims))
+        if sims[best] < ANSWER_CACHE_SIMILARITY:
+            return None
+        
+        # Upserts running in worker threads may clear the cache mid-lookup
+        entry = self._answer_entries[best]
+        if entry is None:
+            return None
+        
+        stored_at, result = entry
+        if time.monotonic() - stored_at > ANSWER_CACHE_TTL_SECONDS:
+            return None
+        return result
+    
+    def _store_cached_answer(self, query_embedding: np.ndarray, result: Dict[str, Any]):
+        """Remember an answer, overwriting the oldest slot once the buffer is full"""
+        if self._answer_vectors is None:
+            self._answer_vectors = np.zeros((ANSWER_CACHE_SIZE, query_embedding.shape[0]), dtype=np.float32)
+        
+        slot = self._answer_next
+        self._answer_vectors[slot] = query_embedding
+        self._answer_entries[slot] = (time.monotonic(), result)
+        self._answer_next = (slot + 1) % ANSWER_CACHE_SIZE
+        self._answer_count = min(self._answer_count + 1, ANSWER_CACHE_SIZE)
+    
+    def _clear_answer_cache(self):
+        """Forget all cached answers"""
+        self._answer_entries = [None] * ANSWER_CACHE_SIZE
+        self._answer_count = 0
+        self._answer_next = 0
+    
     def _company_to_text(self, company: CompanyProfile) -> str:
         """Convert company profile to text for embedding"""
-        parts = [
-            f"Company: {company.name}",
-            f"Industry: {company.industry or 'Unknown'}",
-            f"Description: {company.description or 'No description available'}",
-            f"Size: {company.size or 'Unknown size'}",
-            f"Location: {company.location or 'Unknown location'}",
-            f"Founded: {company.founded or 'Unknown founding year'}",
-            f"Website: {company.website or 'No website'}",
-            f"Employee Count: {company.employees_count or 0}"
-        ]
-        
-        if company.funding:
-            parts.append(f"Funding: {company.funding}")
-            
-        return ". ".join(parts)
+        return _company_text(
+            company.name, company.industry, company.description, company.size, company.location,
+            company.founded, company.website, company.employees_count, company.funding
+        )
     
     def _lead_to_text(self, lead: LeadProfile) -> str:
         """Convert lead profile to text for embedding"""
-        parts = [
-            f"Person: {lead.name}",
-            f"Title: {lead.title or 'Unknown title'}",
-            f"Company: {lead.company}",
-            f"Department: {lead.department or 'Unknown department'}",
-            f"Seniority: {lead.seniority or 'Unknown seniority'}",
-            f"Location: {lead.location or 'Unknown location'}"
-        ]
-        
-        if lead.email:
-            parts.append(f"Email: {lead.email}")
-        if lead.phone:
-            parts.append(f"Phone: {lead.phone}")
-            
-        return ". ".join(parts)
+        return _lead_text(
+            lead.name, lead.title, lead.company, lead.department, lead.seniority,
+            lead.location, lead.email, lead.phone
+        )
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the embedded data"""
@@ -250,3 +606,41 @@ class EmbeddingAgent:
         except Exception as e:
             print(f"Error getting collection stats: {e}")
             return {"total_documents": 0, "collection_name": "unknown"}
+
+@functools.lru_cache(maxsize=4096)
+def _company_text(name, industry, description, size, location, founded, website, employees_count, funding) -> str:
+    """Embedding text for a company, memoized on its fields"""
+    parts = [
+        f"Company: {name}",
+        f"Industry: {industry or 'Unknown'}",
+        f"Description: {description or 'No description available'}",
+        f"Size: {size or 'Unknown size'}",
+        f"Location: {location or 'Unknown location'}",
+        f"Founded: {founded or 'Unknown founding year'}",
+        f"Website: {website or 'No website'}",
+        f"Employee Count: {employees_count or 0}"
+    ]
+    
+    if funding:
+        parts.append(f"Funding: {funding}")
+        
+    return ". ".join(parts)
+
+@functools.lru_cache(maxsize=4096)
+def _lead_text(name, title, company, department, seniority, location, email, phone) -> str:
+    """Embedding text for a lead, memoized on its fields"""
+    parts = [
+        f"Person: {name}",
+        f"Title: {title or 'Unknown title'}",
+        f"Company: {company}",
+        f"Department: {department or 'Unknown department'}",
+        f"Seniority: {seniority or 'Unknown seniority'}",
+        f"Location: {location or 'Unknown location'}"
+    ]
+    
+    if email:
+        parts.append(f"Email: {email}")
+    if phone:
+        parts.append(f"Phone: {phone}")
+        
+    return ". ".join(parts)
@@ -0,0 +1,101 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Callable, List
+
+import numpy as np
+
+# Vector precision per profile: "recall" keeps full float32, "speed" stores
+# float16, halving storage at a negligible recall cost for normalized
+# sentence embeddings
+VECTOR_PROFILES = {"recall": np.float32, "speed": np.float16}
+
+
+class EmbeddingCache:
+    """Content-addressed store of text embeddings, keyed by (model, text hash)"""
+
+    def __init__(self, model_key: str, db_path: str = "embedding_cache.db", dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        # Precision is part of the key so profiles never read each other's vectors
+        self.model_key = f"{model_key}:{self.dtype.name}"
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID;
+        """)
+
+    @staticmethod
+    def _hash(text: str) -> bytes:
+        """16-byte blake2b digest of the text"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get_or_compute(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for texts, encoding only the ones not cached yet"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        hashes = [self._hash(text) for text in texts]
+        cached = self._lookup(set(hashes))
+
+        # Encode each distinct missing text once
+        miss_index = {}
+        for i, text_hash in enumerate(hashes):
+            if text_hash not in cached and text_hash not in miss_index:
+                miss_index[text_hash] = i
+
+        if miss_index:
+            computed = np.asarray(encode_fn([texts[i] for i in miss_index.values()]))
+            # Round fresh results to the storage precision so hits and
+            # misses return identical vectors
+            computed = computed.astype(self.dtype)
+            self._store([(h, vec.tobytes()) for h, vec in zip(miss_index, computed)])
+            for text_hash, vec in zip(miss_index, computed):
+                cached[text_hash] = vec
+
+        return np.stack([cached[text_hash] for text_hash in hashes]).astype(np.float32)
+
+    def _lookup(self, hashes: set) -> dict:
+        """Fetch cached vectors for the given hashes"""
+        hashes = list(hashes)
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT text_hash, embedding FROM embedding_cache "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_key, *chunk]
+                ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype=self.dtype)
+        return found
+
+    def _store(self, items: List[tuple]):
+        """Persist (hash, vector bytes) pairs in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (model, text_hash, embedding) VALUES (?, ?, ?)",
+                    [(self.model_key, text_hash, blob) for text_hash, blob in items]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                # Never leave the shared connection inside an open transaction
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
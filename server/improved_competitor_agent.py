@@ -1,13 +1,33 @@
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
 from bs4 import BeautifulSoup
-import json
+import orjson
 import re
 import logging
 from dataclasses import dataclass
+from llm_json import parse_llm_json
+from database import DatabaseManager
 
-@dataclass
+if TYPE_CHECKING:
+    from embedding_agent import EmbeddingAgent
+
+# Line cleanup for the plain-text competitor fallback
+_NUM_PREFIX_RE = re.compile(r'^\d+\.\s*')
+_BULLET_PREFIX_RE = re.compile(r'^[-*]\s*')
+_NAME_PREFIX_RE = re.compile(r'^([^-:]+)')
+
+# Most competitors verified by a single LLM prompt
+VERIFY_BATCH_SIZE = 30
+
+# Company context changes slowly, so summaries stay fresh for a week
+CONTEXT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# A stored company this similar to the seed stands in for the LLM summary
+CONTEXT_MATCH_SIMILARITY = 0.8
+
+@dataclass(slots=True)
 class CompetitorInfo:
     name: str
     confidence_score: float
@@ -16,10 +36,19 @@ class CompetitorInfo:
     verified: bool = False
 
 class ImprovedCompetitorDiscoveryAgent:
-    def __init__(self, openrouter_api_key: str):
+    def __init__(self,
+                 openrouter_api_key: str,
+                 db: Optional[DatabaseManager] = None,
+                 embedding_agent: Optional["EmbeddingAgent"] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         self.openrouter_api_key = openrouter_api_key
         self.base_url = "https://openrouter.ai/api/v1"
         self.logger = logging.getLogger(__name__)
+        self.db = db
+        self.embedding_agent = embedding_agent
+        
+        # company (lowercased) -> (monotonic timestamp, context summary)
+        self._context_cache: Dict[str, Tuple[float, str]] = {}
         
         # Company validation patterns
         self.invalid_patterns = [
@@ -33,11 +62,45 @@ class ImprovedCompetitorDiscoveryAgent:
             r'[company|corp|inc|ltd][\s\d]+$',
             r'^[a-z\s]+\s\d+$'
         ]
+        self.placeholder_words = ['placeholder', 'example', 'dummy', 'test', 'mock', 'sample']
+        
+        # One combined pattern, so each candidate is scanned once; the last
+        # branch catches placeholder words anywhere in the name
+        self._invalid_re = re.compile(
+            "|".join(f"(?:{p})" for p in self.invalid_patterns)
+            + "|.*(?:" + "|".join(self.placeholder_words) + ")",
+            re.DOTALL
+        )
+        
+        # Caps concurrent verification calls to the LLM
+        self._verify_sem = asyncio.Semaphore(8)
+        
+        # Shared pooled client; HTTP/2 multiplexes the parallel verify calls.
+        # An injected transport shares its connection pool with other agents,
+        # otherwise the agent builds its own
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=transport,
+            headers={
+                "Authorization": f"Bearer {self.openrouter_api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(45.0, connect=5.0)
+        )
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self.client.aclose()
         
     async def discover_competitors(self, seed_company: str, max_competitors: int = 10) -> List[str]:
         """Discover verified competitors with quality filtering"""
         if not seed_company or len(seed_company.strip()) < 2:
-            self.logger.warning(f"Invalid seed company: {seed_company}")
+            self.logger.warning("Invalid seed company: %s", seed_company)
             return []
             
         competitors_with_scores = []
@@ -95,62 +158,103 @@ class ImprovedCompetitorDiscoveryAgent:
         """
         
         try:
-            async with httpx.AsyncClient(timeout=45.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.openrouter_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "anthropic/claude-3-haiku",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 2000,
-                        "temperature": 0.3
-                    }
-                )
+            response = await self.client.post(
+                "/chat/completions",
+                json={
+                    "model": "anthropic/claude-3-haiku",
+                    "messages": [
+                        {"role": "user", "content": prompt}
+                    ],
+                    "max_tokens": 2000,
+                    "temperature": 0.3
+                },
+                timeout=45.0
+            )
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                content = data["choices"][0]["message"]["content"]
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    content = data["choices"][0]["message"]["content"]
+                # Extract JSON from response
+                competitors_data = parse_llm_json(content, "[")
+                if isinstance(competitors_data, list):
+                    competitors = []
                     
-                    # Extract JSON from response
-                    json_match = re.search(r'\[.*\]', content, re.DOTALL)
-                    if json_match:
-                        try:
-                            competitors_data = json.loads(json_match.group())
-                            competitors = []
-                            
-                            for comp_data in competitors_data:
-                                if isinstance(comp_data, dict) and 'name' in comp_data:
-                                    name = comp_data['name'].strip()
-                                    
-                                    # Validate competitor name
-                                    if self._is_valid_company_name(name, seed_company):
-                                        competitors.append(CompetitorInfo(
-                                            name=name,
-                                            confidence_score=comp_data.get('confidence', 0.7),
-                                            source="LLM_Verified",
-                                            industry_match=True
-                                        ))
-                            
-                            return competitors
+                    for comp_data in competitors_data:
+                        if isinstance(comp_data, dict) and 'name' in comp_data:
+                            name = comp_data['name'].strip()
                             
-                        except json.JSONDecodeError as e:
-                            self.logger.error(f"JSON parsing error: {e}")
-                    
-                    # Fallback: Parse line by line if JSON fails
-                    return self._parse_text_competitors(content, seed_company)
+                            # Validate competitor name
+                            if self._is_valid_company_name(name, seed_company):
+                                competitors.append(CompetitorInfo(
+                                    name=name,
+                                    confidence_score=comp_data.get('confidence', 0.7),
+                                    source="LLM_Verified",
+                                    industry_match=True
+                                ))
                     
+                    return competitors
+                
+                self.logger.error("Could not parse competitor JSON; falling back to text parsing")
+                
+                # Fallback: Parse line by line if JSON fails
+                return self._parse_text_competitors(content, seed_company)
+                
         except Exception as e:
-            self.logger.error(f"Error getting competitors from LLM: {e}")
+            self.logger.error("Error getting competitors from LLM: %s", e)
             
         return []
     
     async def _get_company_context(self, company_name: str) -> str:
-        """Get basic company context to improve competitor discovery"""
+        """Get basic company context, serving repeat and already-researched companies without the LLM"""
+        key = company_name.lower().strip()
+        
+        # In-process cache first
+        cached = self._context_cache.get(key)
+        if cached and time.monotonic() - cached[0] < CONTEXT_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        # Then the persisted cache, which survives restarts
+        context = None
+        if self.db:
+            context = await asyncio.to_thread(self.db.get_cached_company_context, key, CONTEXT_CACHE_TTL_SECONDS)
+        
+        # Then a profile we have already embedded, then the LLM
+        if not context:
+            context = await self._context_from_embeddings(company_name)
+        if not context:
+            context = await self._fetch_company_context(company_name)
+            if not context:
+                # Failed call; don't cache the placeholder
+                return f"Technology company in the {company_name} industry"
+            if self.db:
+                await asyncio.to_thread(self.db.save_cached_company_context, key, context)
+        
+        self._context_cache[key] = (time.monotonic(), context)
+        return context
+    
+    async def _context_from_embeddings(self, company_name: str) -> Optional[str]:
+        """Use the stored profile text of the closest embedded company, if it is a match"""
+        if not self.embedding_agent:
+            return None
+        
+        try:
+            results = await asyncio.to_thread(
+                self.embedding_agent.search_similar, company_name, 1, {"type": "company"}
+            )
+            if results["documents"]:
+                # Distance is 1 - similarity for normalized embeddings
+                same_name = results["metadatas"][0].get("name", "").lower() == company_name.lower().strip()
+                if same_name or 1 - results["distances"][0] >= CONTEXT_MATCH_SIMILARITY:
+                    return results["documents"][0]
+                    
+        except Exception as e:
+            self.logger.error("Error looking up stored company context: %s", e)
+            
+        return None
+    
+    async def _fetch_company_context(self, company_name: str) -> Optional[str]:
+        """Ask the LLM for basic company context to improve competitor discovery"""
         prompt = f"""
         Provide a brief analysis of "{company_name}":
         - Primary industry
@@ -162,31 +266,27 @@ class ImprovedCompetitorDiscoveryAgent:
         """
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.openrouter_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "anthropic/claude-3-haiku",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 300,
-                        "temperature": 0.2
-                    }
-                )
+            response = await self.client.post(
+                "/chat/completions",
+                json={
+                    "model": "anthropic/claude-3-haiku",
+                    "messages": [
+                        {"role": "user", "content": prompt}
+                    ],
+                    "max_tokens": 300,
+                    "temperature": 0.2
+                },
+                timeout=30.0
+            )
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                return data["choices"][0]["message"]["content"]
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return data["choices"][0]["message"]["content"]
-                    
         except Exception as e:
-            self.logger.error(f"Error getting company context: {e}")
+            self.logger.error("Error getting company context: %s", e)
             
-        return f"Technology company in the {company_name} industry"
+        return None
     
     def _is_valid_company_name(self, name: str, seed_company: str) -> bool:
         """Validate if competitor name is legitimate"""
@@ -200,11 +300,6 @@ class ImprovedCompetitorDiscoveryAgent:
         if name_lower == seed_lower:
             return False
             
-        # Check against invalid patterns
-        for pattern in self.invalid_patterns:
-            if re.match(pattern, name_lower):
-                return False
-                
         # Additional quality checks
         if len(name) > 100:  # Unreasonably long
             return False
@@ -212,9 +307,8 @@ class ImprovedCompetitorDiscoveryAgent:
         if name.count(' ') > 6:  # Too many words
             return False
             
-        # Check for placeholder indicators
-        placeholder_words = ['placeholder', 'example', 'dummy', 'test', 'mock', 'sample']
-        if any(word in name_lower for word in placeholder_words):
+        # Check against invalid patterns and placeholder indicators
+        if self._invalid_re.match(name_lower):
             return False
             
         return True
@@ -230,12 +324,12 @@ class ImprovedCompetitorDiscoveryAgent:
                 continue
                 
             # Clean up the line
-            line = re.sub(r'^\d+\.\s*', '', line)  # Remove numbering
-            line = re.sub(r'^[-*]\s*', '', line)   # Remove bullet points
+            line = _NUM_PREFIX_RE.sub('', line)     # Remove numbering
+            line = _BULLET_PREFIX_RE.sub('', line)  # Remove bullet points
             line = line.strip()
             
             # Extract company name (before any dash or colon)
-            company_match = re.match(r'^([^-:]+)', line)
+            company_match = _NAME_PREFIX_RE.match(line)
             if company_match:
                 name = company_match.group(1).strip()
                 
@@ -253,10 +347,15 @@ class ImprovedCompetitorDiscoveryAgent:
         """Cross-validate competitors with additional verification"""
         validated = []
         
-        for competitor in competitors:
-            # Verify the competitor exists and is relevant
-            is_valid = await self._verify_competitor_relevance(seed_company, competitor.name)
-            
+        # Verify in as few prompts as possible, running the batches concurrently
+        names = [competitor.name for competitor in competitors]
+        batches = await asyncio.gather(*(
+            self._verify_batch(seed_company, names[i:i + VERIFY_BATCH_SIZE])
+            for i in range(0, len(names), VERIFY_BATCH_SIZE)
+        ))
+        results = [is_valid for batch in batches for is_valid in batch]
+        
+        for competitor, is_valid in zip(competitors, results):
             if is_valid:
                 competitor.verified = True
                 competitor.confidence_score += 0.2
@@ -267,6 +366,59 @@ class ImprovedCompetitorDiscoveryAgent:
                 
         return validated
     
+    async def _verify_batch(self, seed_company: str, names: List[str]) -> List[bool]:
+        """Verify several competitors with one LLM call, in the order given"""
+        numbered = "\n".join(f"{i}) {name}" for i, name in enumerate(names, 1))
+        prompt = f"""
+        For each of the following companies, decide whether it is a direct competitor of "{seed_company}".
+        
+        {numbered}
+        
+        Consider:
+        - Do they operate in the same industry?
+        - Do they target similar customers?
+        - Do they offer competing products/services?
+        
+        Return only a JSON array:
+        [{{"name": "Company Name", "competes": true}}]
+        """
+        
+        try:
+            async with self._verify_sem:
+                response = await self.client.post(
+                    "/chat/completions",
+                    json={
+                        "model": "anthropic/claude-3-haiku",
+                        "messages": [
+                            {"role": "user", "content": prompt}
+                        ],
+                        "max_tokens": 20 * len(names),
+                        "temperature": 0.1
+                    },
+                    timeout=30.0
+                )
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                content = data["choices"][0]["message"]["content"]
+                
+                items = parse_llm_json(content, "[")
+                if isinstance(items, list):
+                    verdicts = {
+                        str(item.get("name", "")).strip().lower(): bool(item.get("competes"))
+                        for item in items
+                        if isinstance(item, dict)
+                    }
+                    return [verdicts.get(name.strip().lower(), False) for name in names]
+                    
+        except Exception as e:
+            self.logger.error("Error verifying competitor batch: %s", e)
+        
+        # Fall back to one call per competitor
+        return list(await asyncio.gather(*(
+            self._verify_competitor_relevance(seed_company, name) for name in names
+        )))
+    
     async def _verify_competitor_relevance(self, seed_company: str, competitor_name: str) -> bool:
         """Verify if a competitor is actually relevant"""
         prompt = f"""
@@ -281,13 +433,9 @@ class ImprovedCompetitorDiscoveryAgent:
         """
         
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.openrouter_api_key}",
-                        "Content-Type": "application/json"
-                    },
+            async with self._verify_sem:
+                response = await self.client.post(
+                    "/chat/completions",
                     json={
                         "model": "anthropic/claude-3-haiku",
                         "messages": [
@@ -295,41 +443,35 @@ class ImprovedCompetitorDiscoveryAgent:
                         ],
                         "max_tokens": 10,
                         "temperature": 0.1
-                    }
+                    },
+                    timeout=20.0
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     answer = data["choices"][0]["message"]["content"].strip().upper()
                     return "YES" in answer
                     
         except Exception as e:
-            self.logger.error(f"Error verifying competitor relevance: {e}")
+            self.logger.error("Error verifying competitor relevance: %s", e)
             
         return False
     
     def _filter_quality_competitors(self, competitors: List[CompetitorInfo]) -> List[CompetitorInfo]:
         """Filter out low quality competitors"""
-        filtered = []
+        # Quality filter and case-insensitive dedup in one pass, keeping the
+        # highest-confidence record for each name
+        best: Dict[str, CompetitorInfo] = {}
         
         for competitor in competitors:
-            # Quality thresholds
-            min_confidence = 0.5
+            # Quality thresholds; verified competitors get a lower bar
+            min_confidence = 0.3 if competitor.verified else 0.5
+            if competitor.confidence_score < min_confidence:
+                continue
             
-            if competitor.verified:
-                min_confidence = 0.3
-                
-            if competitor.confidence_score >= min_confidence:
-                filtered.append(competitor)
-                
-        # Remove duplicates (case-insensitive)
-        seen_names = set()
-        unique_competitors = []
-        
-        for competitor in filtered:
             name_lower = competitor.name.lower()
-            if name_lower not in seen_names:
-                seen_names.add(name_lower)
-                unique_competitors.append(competitor)
+            previous = best.get(name_lower)
+            if previous is None or competitor.confidence_score > previous.confidence_score:
+                best[name_lower] = competitor
                 
-        return unique_competitors
+        return list(best.values())
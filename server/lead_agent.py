@@ -1,16 +1,285 @@
 import httpx
 import asyncio
-import json
-from typing import List, Dict, Any, Optional
+import time
+import orjson
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, Final
 from models import CompanyProfile, LeadProfile
+from database import DatabaseManager
+from llm_json import JsonStreamScanner, parse_llm_json
+from rate_limiter import CircuitOpenError
+import logging
+import math
+import numpy as np
 import re
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Response cache lifetimes; people listings change faster than company profiles
+APOLLO_COMPANY_TTL_SECONDS = 24 * 3600
+APOLLO_PEOPLE_TTL_SECONDS = 300
+LLM_PROFILE_TTL_SECONDS = 3600
+# In-memory response entries kept before the oldest are evicted; sqlite keeps the rest
+RESPONSE_CACHE_MAX_ENTRIES = 2048
+
+# Apollo returns at most this many people per page
+APOLLO_PAGE_SIZE = 25
+
+# Kept byte-identical across calls so providers can reuse the cached prefix
+PROFILE_SYSTEM_PROMPT = "You output only JSON matching the schema; no prose."
+
+# Default upper bound on mock leads generated per company
+MOCK_LEAD_CAP = 15
+
+# Title keywords that mark seniority, checked in order
+_EXECUTIVE_RE = re.compile(r'vp|ceo|cto|coo|director')
+_MANAGER_RE = re.compile(r'manager|lead|head')
+
+# Static data for mock leads
+FIRST_NAMES: Final[Tuple[str, ...]] = (
+    "Sarah", "Michael", "Jennifer", "David", "Emily", "James", "Jessica", "Robert",
+    "Ashley", "Christopher", "Amanda", "Daniel", "Stephanie", "Matthew", "Nicole",
+    "Andrew", "Samantha", "Joshua", "Elizabeth", "Anthony", "Lauren", "Kevin",
+    "Rachel", "Brian", "Megan", "Mark", "Kimberly", "Steven", "Amy", "Thomas"
+)
+
+LAST_NAMES: Final[Tuple[str, ...]] = (
+    "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+    "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas",
+    "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White",
+    "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker"
+)
+
+TITLE_BY_DEPARTMENT: Final[Dict[str, Tuple[str, ...]]] = {
+    "Sales": (
+        "VP of Sales", "Sales Director", "Senior Account Executive", "Account Executive",
+        "Sales Development Representative", "Business Development Manager", "Regional Sales Manager",
+        "Enterprise Account Manager", "Inside Sales Manager", "Sales Operations Manager"
+    ),
+    "Marketing": (
+        "VP of Marketing", "Marketing Director", "Digital Marketing Manager", "Content Marketing Manager",
+        "Growth Marketing Manager", "Product Marketing Manager", "Marketing Operations Manager",
+        "Brand Manager", "Demand Generation Manager", "SEO Manager"
+    ),
+    "Product": (
+        "VP of Product", "Product Director", "Senior Product Manager", "Product Manager",
+        "Associate Product Manager", "Product Owner", "UX/UI Designer", "Product Analyst",
+        "Technical Product Manager", "Product Operations Manager"
+    ),
+    "Engineering": (
+        "CTO", "VP of Engineering", "Engineering Director", "Senior Software Engineer",
+        "Software Engineer", "DevOps Engineer", "Data Engineer", "Frontend Engineer",
+        "Backend Engineer", "Full Stack Engineer"
+    ),
+    "Business Development": (
+        "VP of Business Development", "BD Director", "Business Development Manager",
+        "Partnership Manager", "Strategic Partnerships", "Channel Manager",
+        "Alliance Manager", "Corporate Development Manager"
+    ),
+    "Operations": (
+        "COO", "VP of Operations", "Operations Director", "Operations Manager",
+        "Business Operations Manager", "Revenue Operations Manager", "Customer Success Manager",
+        "Finance Manager", "HR Manager", "Legal Counsel"
+    )
+}
+
+DEPARTMENTS: Final[Tuple[str, ...]] = tuple(TITLE_BY_DEPARTMENT)
+
+LOCATIONS: Final[Tuple[str, ...]] = (
+    "San Francisco, CA, USA", "New York, NY, USA", "Seattle, WA, USA", "Austin, TX, USA",
+    "Boston, MA, USA", "Los Angeles, CA, USA", "Chicago, IL, USA", "Denver, CO, USA",
+    "Atlanta, GA, USA", "London, UK", "Toronto, Canada", "Berlin, Germany"
+)
+
+def _as_str(value: Any) -> Optional[str]:
+    """Coerce an Apollo field to str, keeping nulls"""
+    return value if value is None or isinstance(value, str) else str(value)
+
+def _as_int(value: Any) -> Optional[int]:
+    """Coerce an Apollo field to int, or None when it isn't numeric"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _join_location(record: Dict) -> str:
+    """'City, State, Country' from an Apollo record, skipping missing parts"""
+    return ", ".join(part for part in (record.get("city"), record.get("state"), record.get("country")) if part)
+
+@lru_cache(maxsize=1024)
+def _company_domain(company_name: str) -> str:
+    """Domain slug used for mock email addresses"""
+    return company_name.lower().replace(' ', '').replace('.', '')
+
+def _classify_seniority(title: str) -> str:
+    """Map a job title to its seniority level"""
+    title_lower = title.lower()
+    if _EXECUTIVE_RE.search(title_lower):
+        return "Executive"
+    if _MANAGER_RE.search(title_lower):
+        return "Manager"
+    if "senior" in title_lower:
+        return "Senior"
+    return "Individual Contributor"
+
+# Lookup arrays for batch sampling; lowercase forms feed emails and URLs
+_FIRST_NAMES_ARRAY = np.array(FIRST_NAMES)
+_LAST_NAMES_ARRAY = np.array(LAST_NAMES)
+_FIRST_NAMES_LOWER = np.char.lower(_FIRST_NAMES_ARRAY)
+_LAST_NAMES_LOWER = np.char.lower(_LAST_NAMES_ARRAY)
+_LOCATIONS_ARRAY = np.array(LOCATIONS)
+
+# Phone number parts: +1-AAA-BBB-CCCC
+_PHONE_LOW = np.array([200, 100, 1000])
+_PHONE_HIGH = np.array([1000, 1000, 10000])
+_PHONE_FORMAT = "+1-{}-{}-{}"
+
+# Mock titles are fixed, so classify them once at import
+TITLE_TO_SENIORITY: Final[Dict[str, str]] = {
+    title: _classify_seniority(title)
+    for titles in TITLE_BY_DEPARTMENT.values()
+    for title in titles
+}
 
 class LeadDataAgent:
-    def __init__(self, apollo_api_key: str, openrouter_api_key: str):
+    def __init__(self,
+                 apollo_api_key: str,
+                 openrouter_api_key: str,
+                 db: Optional[DatabaseManager] = None,
+                 mock_lead_cap: int = MOCK_LEAD_CAP,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         self.apollo_api_key = apollo_api_key
         self.openrouter_api_key = openrouter_api_key
+        self.db = db
+        self.mock_lead_cap = mock_lead_cap
+        self._rng = np.random.default_rng()
+        
+        # key -> (wall-clock timestamp, response body, ttl), oldest first
+        self._response_cache: "OrderedDict[str, Tuple[float, bytes, float]]" = OrderedDict()
+        # key -> upstream call in flight, shared by concurrent misses
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.cache_stats: Counter = Counter()
         self.apollo_base_url = "https://api.apollo.io/v1"
         self.openrouter_base_url = "https://openrouter.ai/api/v1"
+        
+        # Shared pooled clients, one per upstream, with their static headers;
+        # an injected transport shares its connection pool with other agents,
+        # otherwise both clients share one HTTP/2 pool built here
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0)
+            )
+        self.apollo_client = httpx.AsyncClient(
+            base_url=self.apollo_base_url,
+            transport=transport,
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Api-Key": self.apollo_api_key
+            },
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+        self.llm_client = httpx.AsyncClient(
+            base_url=self.openrouter_base_url,
+            transport=transport,
+            headers={
+                "Authorization": f"Bearer {self.openrouter_api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+    
+    async def aclose(self):
+        """Close the shared HTTP clients"""
+        await asyncio.gather(self.apollo_client.aclose(), self.llm_client.aclose())
+    
+    async def _cached_request(self, key: str, ttl: float, send: Callable[[], Awaitable[bytes]]) -> Dict:
+        """Serve a JSON body from cache while fresh; on upstream failure fall back to a stale copy"""
+        cached = self._response_cache.get(key)
+        if cached is None and self.db:
+            row = await asyncio.to_thread(self.db.get_cached_response, key)
+            if row:
+                cached = (row[1], row[0], ttl)
+                self._remember_response(key, cached)
+        
+        if cached and time.time() - cached[0] < ttl:
+            self.cache_stats["hits"] += 1
+            return orjson.loads(cached[1])
+        
+        # Concurrent misses for the same key share one upstream call, which
+        # drops out of the in-flight table as soon as it finishes
+        pending = self._in_flight.get(key)
+        if pending is None:
+            self.cache_stats["misses"] += 1
+            pending = asyncio.ensure_future(self._refresh_response(key, ttl, send, cached))
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.cache_stats["hits"] += 1
+        
+        return orjson.loads(await asyncio.shield(pending))
+    
+    async def _refresh_response(self, key: str, ttl: float, send: Callable[[], Awaitable[bytes]],
+                                cached: Optional[Tuple[float, bytes, float]]) -> bytes:
+        """Fetch a fresh body for key and cache it; on failure fall back to the stale copy"""
+        try:
+            body = await send()
+            orjson.loads(body)
+        except Exception as e:
+            if cached:
+                logger.warning("Serving stale cache for %s: %s", key, e)
+                self.cache_stats["stale_hits"] += 1
+                return cached[1]
+            raise
+        
+        self._remember_response(key, (time.time(), body, ttl))
+        if self.db:
+            await asyncio.to_thread(self.db.save_cached_response, key, body)
+        return body
+    
+    def _remember_response(self, key: str, entry: Tuple[float, bytes, float]):
+        """Store entry in memory, evicting expired and least recently stored entries"""
+        cache = self._response_cache
+        cache[key] = entry
+        cache.move_to_end(key)
+        
+        now = time.time()
+        while cache:
+            stamp, _, ttl = next(iter(cache.values()))
+            if len(cache) <= RESPONSE_CACHE_MAX_ENTRIES and now - stamp < ttl:
+                break
+            cache.popitem(last=False)
+    
+    @staticmethod
+    async def _read_body(request: Awaitable[httpx.Response]) -> bytes:
+        """Await a request and return its body, raising on HTTP errors"""
+        response = await request
+        response.raise_for_status()
+        return response.content
+    
+    async def fetch_company_and_leads(self, company_name: str, max_leads: int = 20) -> Tuple[Optional[CompanyProfile], List[LeadProfile]]:
+        """Fetch company data and leads concurrently"""
+        company, leads = await asyncio.gather(
+            self.fetch_company_data(company_name),
+            self.fetch_leads_data(company_name, max_leads),
+            return_exceptions=True
+        )
+        
+        # An open provider circuit fails the whole fetch rather than saving made-up data
+        for result in (company, leads):
+            if isinstance(result, CircuitOpenError):
+                raise result
+        
+        # Failures fall back the same way the individual fetches do
+        if isinstance(company, Exception):
+            logger.error("Error fetching company data for %s", company_name, exc_info=company)
+            company = await self._generate_company_profile_llm(company_name)
+        if isinstance(leads, Exception):
+            logger.error("Error fetching leads for %s", company_name, exc_info=leads)
+            leads = await self._generate_mock_leads(company_name, max_leads)
+        
+        return company, leads
     
     async def fetch_company_data(self, company_name: str) -> Optional[CompanyProfile]:
         """Fetch company data from Apollo API and enrich with LLM"""
@@ -24,8 +293,10 @@ class LeadDataAgent:
                 # Fallback to LLM-generated data
                 return await self._generate_company_profile_llm(company_name)
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"Error fetching company data for {company_name}: {e}")
+            logger.error("Error fetching company data for %s", company_name, exc_info=e)
             return await self._generate_company_profile_llm(company_name)
     
     async def fetch_leads_data(self, company_name: str, max_leads: int = 20) -> List[LeadProfile]:
@@ -38,93 +309,105 @@ class LeadDataAgent:
                 # Fallback to mock data
                 return await self._generate_mock_leads(company_name, max_leads)
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"Error fetching leads for {company_name}: {e}")
+            logger.error("Error fetching leads for %s", company_name, exc_info=e)
             return await self._generate_mock_leads(company_name, max_leads)
     
     async def _fetch_from_apollo_companies(self, company_name: str) -> Optional[Dict]:
         """Fetch company data from Apollo API"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.apollo_base_url}/mixed_companies/search",
-                    headers={
-                        "Cache-Control": "no-cache",
-                        "X-Api-Key": self.apollo_api_key
-                    },
+            data = await self._cached_request(
+                f"apollo:companies:{company_name.lower()}",
+                APOLLO_COMPANY_TTL_SECONDS,
+                lambda: self._read_body(self.apollo_client.get(
+                    "/mixed_companies/search",
                     params={
                         "q_organization_name": company_name,
                         "page": 1,
                         "per_page": 1
-                    },
-                    timeout=30.0
-                )
+                    }
+                ))
+            )
+            
+            if data.get("organizations") and len(data["organizations"]) > 0:
+                return data["organizations"][0]
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("organizations") and len(data["organizations"]) > 0:
-                        return data["organizations"][0]
-                        
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"Apollo API error for company {company_name}: {e}")
+            logger.warning("Apollo API error for company %s", company_name, exc_info=e)
             
         return None
     
     async def _fetch_from_apollo_people(self, company_name: str, max_leads: int) -> List[Dict]:
-        """Fetch people data from Apollo API"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.apollo_base_url}/mixed_people/search",
-                    headers={
-                        "Cache-Control": "no-cache",
-                        "X-Api-Key": self.apollo_api_key
-                    },
-                    params={
-                        "q_organization_name": company_name,
-                        "page": 1,
-                        "per_page": min(max_leads, 25)  # Apollo limits per page
-                    },
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("people", [])
-                    
-        except Exception as e:
-            print(f"Apollo API error for people at {company_name}: {e}")
-            
-        return []
+        """Fetch people data from Apollo API, requesting all needed pages concurrently"""
+        pages = math.ceil(max_leads / APOLLO_PAGE_SIZE)
+        per_page = min(max_leads, APOLLO_PAGE_SIZE)
+        results = await asyncio.gather(
+            *[self._fetch_apollo_people_page(company_name, page, per_page) for page in range(1, pages + 1)],
+            return_exceptions=True
+        )
+        
+        people = []
+        for page, result in enumerate(results, start=1):
+            if isinstance(result, CircuitOpenError):
+                raise result
+            if isinstance(result, Exception):
+                logger.warning("Apollo API error for people at %s (page %d)", company_name, page, exc_info=result)
+                continue
+            people.extend(result)
+        
+        return people[:max_leads]
+    
+    async def _fetch_apollo_people_page(self, company_name: str, page: int, per_page: int) -> List[Dict]:
+        """Fetch one page of people data from Apollo API"""
+        data = await self._cached_request(
+            f"apollo:people:{company_name.lower()}:{page}:{per_page}",
+            APOLLO_PEOPLE_TTL_SECONDS,
+            lambda: self._read_body(self.apollo_client.get(
+                "/mixed_people/search",
+                params={
+                    "q_organization_name": company_name,
+                    "page": page,
+                    "per_page": per_page
+                }
+            ))
+        )
+        return data.get("people", [])
     
     def _convert_apollo_to_company_profile(self, apollo_data: Dict, company_name: str) -> CompanyProfile:
         """Convert Apollo API response to CompanyProfile"""
-        return CompanyProfile(
-            name=apollo_data.get("name", company_name),
-            domain=apollo_data.get("website_url", ""),
-            description=apollo_data.get("short_description", ""),
-            industry=apollo_data.get("industry", ""),
-            size=f"{apollo_data.get('estimated_num_employees', 0)} employees",
-            location=f"{apollo_data.get('city', '')}, {apollo_data.get('state', '')}, {apollo_data.get('country', '')}".strip(", "),
-            founded=str(apollo_data.get("founded_year", "")),
-            funding=apollo_data.get("total_funding", ""),
-            employees_count=apollo_data.get("estimated_num_employees", 0),
-            linkedin_url=apollo_data.get("linkedin_url", ""),
-            website=apollo_data.get("website_url", "")
+        # Fields are coerced here, so skip pydantic validation
+        employees = _as_int(apollo_data.get("estimated_num_employees", 0))
+        return CompanyProfile.model_construct(
+            name=_as_str(apollo_data.get("name")) or company_name,
+            domain=_as_str(apollo_data.get("website_url", "")),
+            description=_as_str(apollo_data.get("short_description", "")),
+            industry=_as_str(apollo_data.get("industry", "")),
+            size=f"{employees or 0} employees",
+            location=_join_location(apollo_data),
+            founded=_as_str(apollo_data.get("founded_year", "")),
+            funding=_as_str(apollo_data.get("total_funding", "")),
+            employees_count=employees,
+            linkedin_url=_as_str(apollo_data.get("linkedin_url", "")),
+            website=_as_str(apollo_data.get("website_url", ""))
         )
     
     def _convert_apollo_to_lead_profile(self, apollo_person: Dict, company_name: str) -> LeadProfile:
         """Convert Apollo person data to LeadProfile"""
-        return LeadProfile(
-            name=f"{apollo_person.get('first_name', '')} {apollo_person.get('last_name', '')}".strip(),
-            title=apollo_person.get("title", ""),
+        departments = apollo_person.get("departments")
+        return LeadProfile.model_construct(
+            name=f"{apollo_person.get('first_name') or ''} {apollo_person.get('last_name') or ''}".strip(),
+            title=_as_str(apollo_person.get("title", "")),
             company=company_name,
-            email=apollo_person.get("email", ""),
-            linkedin_url=apollo_person.get("linkedin_url", ""),
-            phone=apollo_person.get("phone", ""),
-            location=f"{apollo_person.get('city', '')}, {apollo_person.get('state', '')}, {apollo_person.get('country', '')}".strip(", "),
-            department=apollo_person.get("departments", [""])[0] if apollo_person.get("departments") else "",
-            seniority=apollo_person.get("seniority", "")
+            email=_as_str(apollo_person.get("email", "")),
+            linkedin_url=_as_str(apollo_person.get("linkedin_url", "")),
+            phone=_as_str(apollo_person.get("phone", "")),
+            location=_join_location(apollo_person),
+            department=_as_str(departments[0]) if departments else "",
+            seniority=_as_str(apollo_person.get("seniority", ""))
         )
     
     async def _generate_company_profile_llm(self, company_name: str) -> CompanyProfile:
@@ -149,36 +432,18 @@ class LeadDataAgent:
         """
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.openrouter_base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.openrouter_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "anthropic/claude-3-haiku",
-                        "messages": [
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 1000,
-                        "temperature": 0.3
-                    },
-                    timeout=30.0
-                )
+            # Cached as the extracted profile object, not the raw completion
+            company_data = await self._cached_request(
+                f"llm:company_profile_json:{company_name.lower()}",
+                LLM_PROFILE_TTL_SECONDS,
+                lambda: self._stream_json_object(prompt)
+            )
+            return CompanyProfile(**company_data)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    content = data["choices"][0]["message"]["content"]
-                    
-                    # Extract JSON from response
-                    json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                    if json_match:
-                        company_data = json.loads(json_match.group())
-                        return CompanyProfile(**company_data)
-                        
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"Error generating company profile with LLM: {e}")
+            logger.warning("Error generating company profile with LLM for %s", company_name, exc_info=e)
         
         # Fallback to basic profile
         return CompanyProfile(
@@ -187,109 +452,86 @@ class LeadDataAgent:
             industry="Technology"
         )
     
-    async def _generate_mock_leads(self, company_name: str, max_leads: int) -> List[LeadProfile]:
-        """Generate realistic mock leads for testing"""
-        # Realistic first and last names
-        first_names = [
-            "Sarah", "Michael", "Jennifer", "David", "Emily", "James", "Jessica", "Robert",
-            "Ashley", "Christopher", "Amanda", "Daniel", "Stephanie", "Matthew", "Nicole",
-            "Andrew", "Samantha", "Joshua", "Elizabeth", "Anthony", "Lauren", "Kevin",
-            "Rachel", "Brian", "Megan", "Mark", "Kimberly", "Steven", "Amy", "Thomas"
-        ]
-        
-        last_names = [
-            "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
-            "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas",
-            "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White",
-            "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker"
-        ]
+    async def _stream_json_object(self, prompt: str) -> bytes:
+        """Stream a completion and stop reading once the first JSON object closes"""
+        scanner = JsonStreamScanner("{")
+        segment = None
         
-        # More specific titles based on departments
-        title_by_department = {
-            "Sales": [
-                "VP of Sales", "Sales Director", "Senior Account Executive", "Account Executive",
-                "Sales Development Representative", "Business Development Manager", "Regional Sales Manager",
-                "Enterprise Account Manager", "Inside Sales Manager", "Sales Operations Manager"
-            ],
-            "Marketing": [
-                "VP of Marketing", "Marketing Director", "Digital Marketing Manager", "Content Marketing Manager",
-                "Growth Marketing Manager", "Product Marketing Manager", "Marketing Operations Manager",
-                "Brand Manager", "Demand Generation Manager", "SEO Manager"
-            ],
-            "Product": [
-                "VP of Product", "Product Director", "Senior Product Manager", "Product Manager",
-                "Associate Product Manager", "Product Owner", "UX/UI Designer", "Product Analyst",
-                "Technical Product Manager", "Product Operations Manager"
-            ],
-            "Engineering": [
-                "CTO", "VP of Engineering", "Engineering Director", "Senior Software Engineer",
-                "Software Engineer", "DevOps Engineer", "Data Engineer", "Frontend Engineer",
-                "Backend Engineer", "Full Stack Engineer"
-            ],
-            "Business Development": [
-                "VP of Business Development", "BD Director", "Business Development Manager",
-                "Partnership Manager", "Strategic Partnerships", "Channel Manager",
-                "Alliance Manager", "Corporate Development Manager"
-            ],
-            "Operations": [
-                "COO", "VP of Operations", "Operations Director", "Operations Manager",
-                "Business Operations Manager", "Revenue Operations Manager", "Customer Success Manager",
-                "Finance Manager", "HR Manager", "Legal Counsel"
-            ]
-        }
+        async with self.llm_client.stream(
+            "POST",
+            "/chat/completions",
+            json={
+                "model": "anthropic/claude-3-haiku",
+                "messages": [
+                    {"role": "system", "content": PROFILE_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                # The profile schema fits comfortably in 256 tokens
+                "max_tokens": 256,
+                "temperature": 0,
+                # Honoured by models that support JSON mode; the scanner covers the rest
+                "response_format": {"type": "json_object"},
+                "stream": True
+            }
+        ) as response:
+            response.raise_for_status()
+            
+            # Server-sent events; leaving the block early cancels the rest of the stream
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                payload = line[6:]
+                if payload == "[DONE]":
+                    break
+                
+                choices = orjson.loads(payload).get("choices")
+                if choices:
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        segment = scanner.feed(delta)
+                        if segment is not None:
+                            break
         
-        departments = list(title_by_department.keys())
+        # Truncated objects still go through the repair path
+        data = parse_llm_json(segment or scanner.partial() or "", "{")
+        if not isinstance(data, dict):
+            raise ValueError("LLM response contained no JSON object")
+        return orjson.dumps(data)
+    
+    async def _generate_mock_leads(self, company_name: str, max_leads: int) -> List[LeadProfile]:
+        """Generate realistic mock leads for testing"""
+        n = min(max_leads, self.mock_lead_cap)
         
-        # Locations for variety
-        locations = [
-            "San Francisco, CA, USA", "New York, NY, USA", "Seattle, WA, USA", "Austin, TX, USA",
-            "Boston, MA, USA", "Los Angeles, CA, USA", "Chicago, IL, USA", "Denver, CO, USA",
-            "Atlanta, GA, USA", "London, UK", "Toronto, Canada", "Berlin, Germany"
-        ]
+        # Sample every random field for the whole batch up front
+        first_idx = self._rng.integers(len(FIRST_NAMES), size=n)
+        last_idx = self._rng.integers(len(LAST_NAMES), size=n)
+        first_names = _FIRST_NAMES_ARRAY[first_idx].tolist()
+        last_names = _LAST_NAMES_ARRAY[last_idx].tolist()
+        email_firsts = _FIRST_NAMES_LOWER[first_idx].tolist()
+        email_lasts = _LAST_NAMES_LOWER[last_idx].tolist()
+        locations = _LOCATIONS_ARRAY[self._rng.integers(len(LOCATIONS), size=n)].tolist()
+        phones = self._rng.integers(_PHONE_LOW, _PHONE_HIGH, size=(n, 3)).tolist()
+        email_suffix = f"@{_company_domain(company_name)}.com"
         
         leads = []
-        import random
-        
-        for i in range(min(max_leads, 15)):  # Generate up to 15 realistic leads
+        for i, (first_name, last_name, email_first, email_last, location, phone) in enumerate(
+            zip(first_names, last_names, email_firsts, email_lasts, locations, phones)
+        ):
             # Select department and corresponding title
-            department = departments[i % len(departments)]
-            titles = title_by_department[department]
+            department = DEPARTMENTS[i % len(DEPARTMENTS)]
+            titles = TITLE_BY_DEPARTMENT[department]
             title = titles[i % len(titles)]
             
-            # Generate realistic name
-            first_name = random.choice(first_names)
-            last_name = random.choice(last_names)
-            full_name = f"{first_name} {last_name}"
-            
-            # Generate email based on name and company
-            company_domain = company_name.lower().replace(' ', '').replace('.', '')
-            email_first = first_name.lower()
-            email_last = last_name.lower()
-            email = f"{email_first}.{email_last}@{company_domain}.com"
-            
-            # LinkedIn URL
-            linkedin_url = f"https://linkedin.com/in/{email_first}-{email_last}"
-            
-            # Determine seniority based on title
-            if any(word in title.lower() for word in ["vp", "ceo", "cto", "coo", "director"]):
-                seniority = "Executive"
-            elif any(word in title.lower() for word in ["manager", "lead", "head"]):
-                seniority = "Manager"
-            elif "senior" in title.lower():
-                seniority = "Senior"
-            else:
-                seniority = "Individual Contributor"
-            
             lead = LeadProfile(
-                name=full_name,
+                name=f"{first_name} {last_name}",
                 title=title,
                 company=company_name,
-                email=email,
-                linkedin_url=linkedin_url,
-                phone=f"+1-{random.randint(200, 999)}-{random.randint(100, 999)}-{random.randint(1000, 9999)}",
-                location=random.choice(locations),
+                email=f"{email_first}.{email_last}{email_suffix}",
+                linkedin_url=f"https://linkedin.com/in/{email_first}-{email_last}",
+                phone=_PHONE_FORMAT.format(*phone),
+                location=location,
                 department=department,
-                seniority=seniority
+                seniority=TITLE_TO_SENIORITY[title]
             )
             leads.append(lead)
         
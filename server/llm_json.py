@@ -0,0 +1,97 @@
+import orjson
+from typing import Any, List, Optional
+
+# Repairs near-miss JSON (trailing commas, single quotes, truncation); listed in
+# requirements.txt, since the short profile token budget relies on it
+try:
+    from json_repair import repair_json
+except ImportError:
+    repair_json = None
+
+class JsonStreamScanner:
+    """Incrementally find the first bracket-balanced JSON value in streamed text"""
+    
+    def __init__(self, opener: str = "["):
+        self.opener = opener
+        self.result: Optional[str] = None
+        self._parts: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+    
+    def feed(self, chunk: str) -> Optional[str]:
+        """Consume the next chunk; return the value once its closing bracket arrives"""
+        if self.result is not None:
+            return self.result
+        
+        if not self._started:
+            start = chunk.find(self.opener)
+            if start == -1:
+                return None
+            chunk = chunk[start:]
+            self._started = True
+        
+        for i, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[:i + 1])
+                    self.result = "".join(self._parts)
+                    self._parts = []
+                    return self.result
+        
+        self._parts.append(chunk)
+        return None
+    
+    def partial(self) -> Optional[str]:
+        """Text consumed so far from the opener on, or None if it never appeared"""
+        if self.result is not None:
+            return self.result
+        return "".join(self._parts) if self._started else None
+
+def extract_json_segment(text: str, opener: str = "[") -> Optional[str]:
+    """Return the first bracket-balanced JSON value starting with opener"""
+    scanner = JsonStreamScanner(opener)
+    segment = scanner.feed(text)
+    
+    # Unbalanced (e.g. truncated output); hand the remainder to the repairer
+    return segment if segment is not None else scanner.partial()
+
+def parse_llm_json(text: str, opener: str = "[") -> Optional[Any]:
+    """Parse the first JSON array or object embedded in LLM output, or None"""
+    # Bare JSON replies skip the scan entirely
+    stripped = text.strip()
+    if stripped.startswith(opener):
+        try:
+            return orjson.loads(stripped)
+        except orjson.JSONDecodeError:
+            pass
+    
+    segment = extract_json_segment(text, opener)
+    if segment is None:
+        return None
+    
+    try:
+        return orjson.loads(segment)
+    except orjson.JSONDecodeError:
+        pass
+    
+    if repair_json is not None:
+        try:
+            return orjson.loads(repair_json(segment))
+        except (orjson.JSONDecodeError, ValueError):
+            pass
+    
+    return None
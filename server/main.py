@@ -1,7 +1,12 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from contextlib import asynccontextmanager
 import os
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+import orjson
 from dotenv import load_dotenv
 from typing import List, Dict, Any
 import asyncio
@@ -17,16 +22,40 @@ from database import DatabaseManager
 
 load_dotenv()
 
+# Companies serialized per streamed chunk in /api/companies
+STREAM_CHUNK_SIZE = 100
+
 # Global orchestrator instance
 orchestrator = None
 
+def orjson_response(payload: Any) -> Response:
+    """Encode payload with orjson, skipping FastAPI's jsonable_encoder pass"""
+    return Response(orjson.dumps(payload), media_type="application/json")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global orchestrator
     
+    # Records are queued and written by a listener thread, so log I/O
+    # never blocks the event loop; the level/name prefix is added once, there
+    log_queue = queue.SimpleQueue()
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_listener = QueueListener(log_queue, log_handler)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    log_listener.start()
+    
     openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
     apollo_api_key = os.getenv("APOLLO_API_KEY", "dummy_key")  # Allow dummy key for testing
     max_concurrent_agents = int(os.getenv("MAX_CONCURRENT_AGENTS", "5"))
+    embedding_backend = os.getenv("EMBEDDING_BACKEND", "onnx")
+    vector_profile = os.getenv("VECTOR_PROFILE", "recall")
+    index_profile = os.getenv("INDEX_PROFILE", "balanced")
+    embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    apollo_rpm = float(os.getenv("APOLLO_RPM", "50"))
+    openrouter_rpm = float(os.getenv("OPENROUTER_RPM", "200"))
     
     if not openrouter_api_key:
         raise ValueError("OPENROUTER_API_KEY is required")
@@ -34,14 +63,23 @@ async def lifespan(app: FastAPI):
     orchestrator = MultiAgentOrchestrator(
         openrouter_api_key=openrouter_api_key,
         apollo_api_key=apollo_api_key,
-        max_concurrent_agents=max_concurrent_agents
+        max_concurrent_agents=max_concurrent_agents,
+        embedding_backend=embedding_backend,
+        vector_profile=vector_profile,
+        index_profile=index_profile,
+        embed_batch_size=embed_batch_size,
+        apollo_requests_per_minute=apollo_rpm,
+        openrouter_requests_per_minute=openrouter_rpm
     )
+    orchestrator.start()
     
     print("🚀 Multi-Agent Lead Research System started successfully!")
     yield
     
     # Shutdown
     print("👋 Shutting down...")
+    await orchestrator.aclose()
+    log_listener.stop()
 
 app = FastAPI(
     title="Multi-Agent Lead Research & Competitive Intelligence System",
@@ -50,13 +88,19 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS middleware
+# CORS middleware; explicit lists let Starlette precompute its preflight response
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["authorization", "content-type"],
 )
 
 @app.get("/")
@@ -117,16 +161,11 @@ async def research_company(request: LeadSearchRequest):
             raise HTTPException(status_code=500, detail="System not initialized")
         
         result = await orchestrator.research_single_company_sync(request.company_name)
-        
-        company = None
-        if result["company"]:
-            company = CompanyProfile(**result["company"])
-        
-        leads = [LeadProfile(**lead_data) for lead_data in result["leads"]]
+        leads = result["leads"]
         
         return LeadSearchResponse(
             leads=leads,
-            company=company,
+            company=result["company"],
             total_found=len(leads)
         )
         
@@ -150,6 +189,23 @@ async def chat_with_data(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def stream_chat_with_data(request: ChatRequest):
+    """Chat with collected research data, streaming the answer as Server-Sent Events"""
+    if not orchestrator:
+        raise HTTPException(status_code=500, detail="System not initialized")
+    
+    async def event_stream():
+        async for event in orchestrator.stream_chat_with_data(request.question):
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+        yield b"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @app.get("/api/agents/status")
 async def get_agent_statuses():
     """Get status of all running agents"""
@@ -157,11 +213,60 @@ async def get_agent_statuses():
         if not orchestrator:
             raise HTTPException(status_code=500, detail="System not initialized")
         
-        return {
+        return orjson_response({
             "agents": orchestrator.get_all_agent_statuses(),
-            "summary": orchestrator.get_research_summary()
-        }
+            "summary": await asyncio.to_thread(orchestrator.get_research_summary)
+        })
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting agent status: {str(e)}")
+
+@app.get("/api/agents/events")
+async def stream_agent_events(request: Request):
+    """Stream agent status updates as Server-Sent Events"""
+    if not orchestrator:
+        raise HTTPException(status_code=500, detail="System not initialized")
+    
+    async def event_stream():
+        version = -1
+        while not await request.is_disconnected():
+            new_version = await orchestrator.wait_for_status_change(version, timeout=15.0)
+            if new_version == version:
+                # Nothing changed; keep the connection alive
+                yield b": keepalive\n\n"
+                continue
+            
+            version = new_version
+            payload = {
+                "version": version,
+                "agents": orchestrator.get_all_agent_statuses(),
+                "summary": await asyncio.to_thread(orchestrator.get_research_summary)
+            }
+            yield b"data: " + orjson.dumps(payload) + b"\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/api/agents/poll")
+async def poll_agent_statuses(since: int = -1, timeout: float = 30.0):
+    """Long-poll agent statuses, returning as soon as they change past `since`"""
+    try:
+        if not orchestrator:
+            raise HTTPException(status_code=500, detail="System not initialized")
+        
+        version = await orchestrator.wait_for_status_change(since, timeout=min(timeout, 30.0))
         
+        return orjson_response({
+            "version": version,
+            "agents": orchestrator.get_all_agent_statuses(),
+            "summary": await asyncio.to_thread(orchestrator.get_research_summary)
+        })
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting agent status: {str(e)}")
 
@@ -172,12 +277,12 @@ async def get_agent_status(agent_id: str):
         if not orchestrator:
             raise HTTPException(status_code=500, detail="System not initialized")
         
-        status = orchestrator.get_agent_status(agent_id)
+        status = await orchestrator.get_agent_status(agent_id)
         
         if not status:
             raise HTTPException(status_code=404, detail="Agent not found")
         
-        return status
+        return orjson_response(status)
         
     except HTTPException:
         raise
@@ -191,12 +296,18 @@ async def get_companies():
         if not orchestrator:
             raise HTTPException(status_code=500, detail="System not initialized")
         
-        companies = orchestrator.db.get_all_companies()
+        companies = await asyncio.to_thread(orchestrator.db.get_all_companies)
         
-        return {
-            "companies": [company.dict() for company in companies],
-            "total": len(companies)
-        }
+        async def body():
+            # Serialize in slices so bytes go out while later companies are encoded
+            yield b'{"companies":['
+            for start in range(0, len(companies), STREAM_CHUNK_SIZE):
+                chunk = companies[start:start + STREAM_CHUNK_SIZE]
+                encoded = b",".join(orjson.dumps(company.model_dump()) for company in chunk)
+                yield encoded if start == 0 else b"," + encoded
+            yield b'],"total":' + str(len(companies)).encode() + b"}"
+        
+        return StreamingResponse(body(), media_type="application/json")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting companies: {str(e)}")
@@ -208,17 +319,17 @@ async def get_company_leads(company_name: str):
         if not orchestrator:
             raise HTTPException(status_code=500, detail="System not initialized")
         
-        company = orchestrator.db.get_company(company_name)
+        company = await asyncio.to_thread(orchestrator.db.get_company, company_name)
         if not company:
             raise HTTPException(status_code=404, detail="Company not found")
         
-        leads = orchestrator.db.get_leads_by_company(company_name)
+        leads = await asyncio.to_thread(orchestrator.db.get_leads_by_company, company_name)
         
-        return {
-            "company": company.dict(),
-            "leads": [lead.dict() for lead in leads],
+        return orjson_response({
+            "company": company.model_dump(),
+            "leads": [lead.model_dump() for lead in leads],
             "total_leads": len(leads)
-        }
+        })
         
     except HTTPException:
         raise
@@ -232,13 +343,13 @@ async def search_content(q: str):
         if not orchestrator:
             raise HTTPException(status_code=500, detail="System not initialized")
         
-        results = orchestrator.db.search_content(q)
+        results = await asyncio.to_thread(orchestrator.db.search_content, q)
         
-        return {
+        return orjson_response({
             "query": q,
             "results": results,
             "total": len(results)
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching content: {str(e)}")
@@ -250,11 +361,19 @@ async def get_research_summary():
         if not orchestrator:
             raise HTTPException(status_code=500, detail="System not initialized")
         
-        return orchestrator.get_research_summary()
+        return await asyncio.to_thread(orchestrator.get_research_summary)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting summary: {str(e)}")
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for cached Apollo, LLM profile and competitor lookups"""
+    if not orchestrator:
+        raise HTTPException(status_code=500, detail="System not initialized")
+    
+    return orchestrator.get_cache_stats()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -265,4 +384,13 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # loop="auto" picks uvloop when it is installed (everywhere but Windows).
+    # Agent statuses live in process memory, so each worker only reports its own.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", "1"))
+    )
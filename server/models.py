@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
+
+def utc_now() -> datetime:
+    """Current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
 
 class CompanyProfile(BaseModel):
     name: str
@@ -14,7 +18,7 @@ class CompanyProfile(BaseModel):
     employees_count: Optional[int] = None
     linkedin_url: Optional[str] = None
     website: Optional[str] = None
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=utc_now)
 
 class LeadProfile(BaseModel):
     name: str
@@ -26,7 +30,7 @@ class LeadProfile(BaseModel):
     location: Optional[str] = None
     department: Optional[str] = None
     seniority: Optional[str] = None
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=utc_now)
 
 class CompetitorSearchRequest(BaseModel):
     seed_company: str
@@ -59,4 +63,4 @@ class AgentStatus(BaseModel):
     company: str
     progress: int  # 0-100
     message: str
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=utc_now)
@@ -1,66 +1,255 @@
 import asyncio
+import re
+import time
 import uuid
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+from array import array
+import httpx
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Optional, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
 from competitor_agent import CompetitorDiscoveryAgent
 from lead_agent import LeadDataAgent
-from embedding_agent import EmbeddingAgent
+from embedding_agent import EmbeddingAgent, EMBED_BATCH_SIZE
 from database import DatabaseManager
-from models import AgentStatus, CompanyProfile, LeadProfile
+from rate_limiter import AsyncRateLimiter, CircuitOpenError, RateLimitedTransport
+from models import AgentStatus, CompanyProfile, LeadProfile, utc_now
+
+# How long get_research_summary may be served from cache between writes
+SUMMARY_CACHE_TTL_SECONDS = 30
+
+# Finished tasks stay in memory this long before get_agent_status falls back to the database
+TASK_RETENTION_SECONDS = 300
+
+# Companies refreshed within this window aren't researched again
+RECENT_RESEARCH_SECONDS = 24 * 3600
+
+# Legal-form suffixes and punctuation ignored when comparing company names
+_LEGAL_SUFFIX_RE = re.compile(r'[\s,]+(?:inc|llc|ltd|corp|corporation|co|gmbh|plc)\.?$')
+_NON_WORD_RE = re.compile(r'\W+')
+
+def _company_key(name: str) -> str:
+    """Company name with case, punctuation and legal-form suffix ignored"""
+    lowered = name.lower().strip()
+    return _NON_WORD_RE.sub("", _LEGAL_SUFFIX_RE.sub("", lowered)) or lowered
+
+def _dedupe_company_names(names: List[str]) -> List[str]:
+    """Drop later names that normalize to one already seen, keeping discovery order"""
+    seen: Dict[str, str] = {}
+    for name in names:
+        seen.setdefault(_company_key(name), name)
+    return list(seen.values())
 
 @dataclass
 class AgentTask:
     agent_id: str
     company_name: str
     task_type: str  # "research", "embed"
-    status: str = "pending"
-    progress: int = 0
-    message: str = ""
-    created_at: datetime = datetime.now()
+    created_at: datetime = field(default_factory=utc_now)
+    created_at_iso: str = field(init=False)  # formatted once, reused by every status read
+    
+    def __post_init__(self):
+        self.created_at_iso = self.created_at.isoformat()
+
+class AgentTaskTable:
+    """Live task statuses stored column-wise, so bulk dumps are one pass over flat columns"""
+    
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self.agent_ids: List[str] = []
+        self.companies: List[str] = []
+        self.statuses: List[str] = []
+        self.progress = array("i")
+        self.messages: List[str] = []
+        self.created_at: List[str] = []  # AgentTask.created_at_iso
+    
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._index
+    
+    def __len__(self) -> int:
+        return len(self.agent_ids)
+    
+    def add(self, task: AgentTask):
+        """Start tracking a task as pending"""
+        if task.agent_id in self._index:
+            return
+        self._index[task.agent_id] = len(self.agent_ids)
+        self.agent_ids.append(task.agent_id)
+        self.companies.append(task.company_name)
+        self.statuses.append("pending")
+        self.progress.append(0)
+        self.messages.append("")
+        self.created_at.append(task.created_at_iso)
+    
+    def update(self, agent_id: str, status: str, progress: int, message: str) -> Optional[Tuple[str, str]]:
+        """Record a status change; the task's (company, created_at), or None if it isn't tracked"""
+        i = self._index.get(agent_id)
+        if i is None:
+            return None
+        self.statuses[i] = status
+        self.progress[i] = progress
+        self.messages[i] = message
+        return self.companies[i], self.created_at[i]
+    
+    def remove(self, agent_id: str) -> bool:
+        """Stop tracking a task by moving the last row into its slot"""
+        i = self._index.pop(agent_id, None)
+        if i is None:
+            return False
+        last = len(self.agent_ids) - 1
+        for column in (self.agent_ids, self.companies, self.statuses,
+                       self.progress, self.messages, self.created_at):
+            column[i] = column[last]
+            column.pop()
+        if i != last:
+            self._index[self.agent_ids[i]] = i
+        return True
+    
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Status dict for one task, or None"""
+        i = self._index.get(agent_id)
+        if i is None:
+            return None
+        return {
+            "agent_id": agent_id,
+            "company": self.companies[i],
+            "status": self.statuses[i],
+            "progress": self.progress[i],
+            "message": self.messages[i],
+            "created_at": self.created_at[i]
+        }
+    
+    def all(self) -> List[Dict[str, Any]]:
+        """Status dicts for every task, built in a single zip over the columns"""
+        return [
+            {
+                "agent_id": agent_id,
+                "company": company,
+                "status": status,
+                "progress": progress,
+                "message": message,
+                "created_at": created_at
+            }
+            for agent_id, company, status, progress, message, created_at in zip(
+                self.agent_ids, self.companies, self.statuses,
+                self.progress, self.messages, self.created_at
+            )
+        ]
 
 class MultiAgentOrchestrator:
     def __init__(self, 
                  openrouter_api_key: str, 
                  apollo_api_key: str,
-                 max_concurrent_agents: int = 5):
+                 max_concurrent_agents: int = 5,
+                 embedding_backend: str = "onnx",
+                 vector_profile: str = "recall",
+                 index_profile: str = "balanced",
+                 embed_batch_size: int = EMBED_BATCH_SIZE,
+                 apollo_requests_per_minute: float = 50,
+                 openrouter_requests_per_minute: float = 200):
         self.openrouter_api_key = openrouter_api_key
         self.apollo_api_key = apollo_api_key
         self.max_concurrent_agents = max_concurrent_agents
+        self.embed_batch_size = embed_batch_size
+        
+        # One HTTP/2 connection pool shared by every agent, so OpenRouter and
+        # Apollo connections are reused across agents instead of per client.
+        # Requests are paced per provider to stay under their quotas
+        self.http_transport = RateLimitedTransport(
+            httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=75.0)
+            ),
+            {
+                "api.apollo.io": AsyncRateLimiter(apollo_requests_per_minute),
+                "openrouter.ai": AsyncRateLimiter(openrouter_requests_per_minute)
+            }
+        )
         
         # Initialize agents
-        self.competitor_agent = CompetitorDiscoveryAgent(openrouter_api_key)
-        self.lead_agent = LeadDataAgent(apollo_api_key, openrouter_api_key)
-        self.embedding_agent = EmbeddingAgent(openrouter_api_key)
-        self.db = DatabaseManager()
+        self.db = DatabaseManager(vector_profile=vector_profile)
+        self.competitor_agent = CompetitorDiscoveryAgent(
+            openrouter_api_key,
+            db=self.db,
+            transport=self.http_transport
+        )
+        self.lead_agent = LeadDataAgent(
+            apollo_api_key,
+            openrouter_api_key,
+            db=self.db,
+            transport=self.http_transport
+        )
+        self.embedding_agent = EmbeddingAgent(
+            openrouter_api_key,
+            backend=embedding_backend,
+            index_profile=index_profile,
+            vector_profile=vector_profile,
+            transport=self.http_transport
+        )
         
         # Task management
-        self.active_tasks: Dict[str, AgentTask] = {}
+        self.active_tasks = AgentTaskTable()
         self.task_queue: List[AgentTask] = []
-        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_agents)
         
-        # Setup logging
-        logging.basicConfig(level=logging.INFO)
+        # Shared across sessions so overlapping launches respect the same bound
+        self._research_semaphore = asyncio.Semaphore(max_concurrent_agents)
+        
+        # Bumped on every status change so listeners can wait instead of polling
+        self._status_version = 0
+        self._status_changed = asyncio.Event()
+        self._status_flusher = None
+        
+        # (generation, monotonic timestamp, summary); the generation moves on every write
+        self._summary_cache: Optional[Tuple[int, float, Dict[str, Any]]] = None
+        self._summary_generation = 0
+        
         self.logger = logging.getLogger(__name__)
     
+    def start(self):
+        """Start background maintenance tasks; call from within the event loop"""
+        self._status_flusher = asyncio.create_task(self.db.run_agent_status_flusher())
+    
+    async def aclose(self):
+        """Stop background tasks and release resources held by the agents"""
+        if self._status_flusher:
+            self._status_flusher.cancel()
+            try:
+                await self._status_flusher
+            except asyncio.CancelledError:
+                pass
+        
+        # Closing a client closes its transport; closing the shared pool is idempotent
+        await self.competitor_agent.aclose()
+        await self.lead_agent.aclose()
+        await self.embedding_agent.aclose()
+        await self.http_transport.aclose()
+    
     async def launch_competitor_research(self, seed_company: str, max_competitors: int = 10) -> str:
         """Launch multi-agent research for competitors"""
         session_id = str(uuid.uuid4())
-        self.logger.info(f"Starting competitor research session {session_id} for {seed_company}")
+        self.logger.info("Starting competitor research session %s for %s", session_id, seed_company)
         
         try:
             # Step 1: Discover competitors
-            self.logger.info(f"Discovering competitors for {seed_company}")
+            self.logger.info("Discovering competitors for %s", seed_company)
             competitors = await self.competitor_agent.discover_competitors(seed_company, max_competitors)
             
             if not competitors:
-                self.logger.warning(f"No competitors found for {seed_company}")
+                self.logger.warning("No competitors found for %s", seed_company)
                 return session_id
             
-            self.logger.info(f"Found {len(competitors)} competitors: {competitors}")
+            self.logger.info("Found %d competitors: %s", len(competitors), competitors)
+            
+            # Skip name variants of the same company and anything researched recently
+            competitors = _dedupe_company_names(competitors)
+            # Stored names are compared on the same key, so "Acme" matches a saved "Acme, Inc."
+            recent_names = await asyncio.to_thread(self.db.get_recently_updated_companies, RECENT_RESEARCH_SECONDS)
+            recent = {_company_key(name) for name in recent_names}
+            skipped = [competitor for competitor in competitors if _company_key(competitor) in recent]
+            if skipped:
+                self.logger.info("Skipping recently researched competitors: %s", skipped)
+                competitors = [competitor for competitor in competitors if _company_key(competitor) not in recent]
             
             # Step 2: Create research tasks for each competitor
             research_tasks = []
@@ -71,147 +260,250 @@ class MultiAgentOrchestrator:
                     task_type="research"
                 )
                 research_tasks.append(task)
-                self.active_tasks[task.agent_id] = task
+                self.active_tasks.add(task)
             
             # Step 3: Execute research tasks in parallel
             await self._execute_parallel_research(research_tasks)
             
-            self.logger.info(f"Completed competitor research session {session_id}")
+            self.logger.info("Completed competitor research session %s", session_id)
             return session_id
             
         except Exception as e:
-            self.logger.error(f"Error in competitor research session {session_id}: {e}")
+            self.logger.error("Error in competitor research session %s: %s", session_id, e)
             return session_id
     
     async def _execute_parallel_research(self, tasks: List[AgentTask]):
         """Execute research tasks in parallel with concurrency limit"""
-        semaphore = asyncio.Semaphore(self.max_concurrent_agents)
+        # Execute all tasks concurrently; one failure must not abort the rest.
+        # Embedding is deferred so the whole session is encoded in a few batches
+        results = await asyncio.gather(
+            *[self._bounded(self._research_company(task, defer_embedding=True)) for task in tasks],
+            return_exceptions=True
+        )
+        
+        documents = []
+        embedded_tasks = []
+        # Document ids each task still waits on, and the tasks waiting on each id
+        pending_docs: Dict[str, set] = {}
+        doc_owners: Dict[str, List[AgentTask]] = {}
+        for task, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                self.logger.error("Research task for %s failed: %s", task.company_name, result)
+            elif result:
+                documents.extend(result)
+                embedded_tasks.append(task)
+                pending_docs[task.agent_id] = {doc[0] for doc in result}
+                for doc in result:
+                    doc_owners.setdefault(doc[0], []).append(task)
+        
+        if not documents:
+            return
+        
+        async def slice_stored(doc_ids: List[str]):
+            # A task completes as soon as the last slice holding its documents is stored
+            self._invalidate_summary()
+            for doc_id in doc_ids:
+                for task in doc_owners.pop(doc_id, ()):
+                    remaining = pending_docs[task.agent_id]
+                    remaining.discard(doc_id)
+                    if not remaining:
+                        await self._update_task_status(task.agent_id, "completed", 100, f"Research completed successfully")
         
-        async def research_single_company(task: AgentTask):
-            async with semaphore:
-                await self._research_company(task)
+        async def fail_unembedded(message: str):
+            for task in embedded_tasks:
+                if pending_docs[task.agent_id]:
+                    await self._update_task_status(task.agent_id, "failed", 80, message)
         
-        # Execute all tasks concurrently
-        await asyncio.gather(*[research_single_company(task) for task in tasks])
+        self.logger.info("Embedding %d documents from %d companies", len(documents), len(embedded_tasks))
+        try:
+            await self.embedding_agent.aembed_batch(documents, self.embed_batch_size, on_slice_done=slice_stored)
+        except asyncio.CancelledError:
+            await fail_unembedded("Embedding cancelled")
+            raise
+        except Exception as e:
+            self.logger.error("Embedding failed for session documents: %s", e)
+            await fail_unembedded(f"Embedding failed: {str(e)}")
+    
+    async def _bounded(self, coro: Awaitable[Any]) -> Any:
+        """Await coro while holding a research slot"""
+        async with self._research_semaphore:
+            return await coro
     
-    async def _research_company(self, task: AgentTask):
-        """Research a single company and its leads"""
+    async def _research_company(self, task: AgentTask, defer_embedding: bool = False) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Research a single company and its leads; with defer_embedding, return its documents instead of embedding them"""
         try:
-            self._update_task_status(task.agent_id, "running", 10, f"Starting research for {task.company_name}")
+            await self._update_task_status(task.agent_id, "running", 10, f"Starting research for {task.company_name}")
             
-            # Step 1: Fetch company data
-            self.logger.info(f"Fetching company data for {task.company_name}")
-            company = await self.lead_agent.fetch_company_data(task.company_name)
+            # Step 1: Fetch company and leads data concurrently
+            self.logger.info("Fetching company data and leads for %s", task.company_name)
+            company, leads = await self.lead_agent.fetch_company_and_leads(task.company_name, max_leads=20)
             
-            if company:
-                company_id = self.db.save_company(company)
-                self._update_task_status(task.agent_id, "running", 30, f"Company data saved")
-            else:
-                self._update_task_status(task.agent_id, "failed", 30, f"Failed to fetch company data")
-                return
+            if not company:
+                await self._update_task_status(task.agent_id, "failed", 30, f"Failed to fetch company data")
+                return []
             
-            # Step 2: Fetch leads data
-            self.logger.info(f"Fetching leads for {task.company_name}")
-            leads = await self.lead_agent.fetch_leads_data(task.company_name, max_leads=20)
+            leads = leads or []
+            saved_message = (
+                f"Company data and {len(leads)} leads saved" if leads
+                else f"Company data saved; no leads found"
+            )
             
-            if leads:
-                for lead in leads:
-                    self.db.save_lead(lead)
-                self._update_task_status(task.agent_id, "running", 60, f"Saved {len(leads)} leads")
-            else:
-                self._update_task_status(task.agent_id, "running", 60, f"No leads found")
+            # Step 2: Save company and leads in one transaction
+            if defer_embedding:
+                await asyncio.to_thread(self.db.save_company_with_leads, company, leads)
+                self._invalidate_summary()
+                await self._update_task_status(task.agent_id, "running", 60, saved_message)
+                
+                # Step 3: Embedding happens once for the whole session
+                await self._update_task_status(task.agent_id, "running", 80, f"Queued for embedding")
+                return self.embedding_agent.profile_documents([company], leads)
             
-            # Step 3: Embed data
-            self.logger.info(f"Embedding data for {task.company_name}")
+            # Steps 2 and 3 are independent, so save and embed run side by side;
+            # progress advances as each stage finishes, in whichever order
+            self.logger.info("Saving and embedding data for %s", task.company_name)
+            stages_done = 0
             
-            # Embed company
-            if company:
-                self.embedding_agent.embed_company(company)
+            async def run_stage(stage: Awaitable[Any], message: str):
+                nonlocal stages_done
+                await stage
+                self._invalidate_summary()
+                stages_done += 1
+                await self._update_task_status(task.agent_id, "running", 30 + 30 * stages_done, message)
             
-            # Embed leads
-            if leads:
-                self.embedding_agent.embed_multiple_leads(leads)
+            await asyncio.gather(
+                run_stage(asyncio.to_thread(self.db.save_company_with_leads, company, leads), saved_message),
+                run_stage(asyncio.to_thread(self.embedding_agent.embed_profiles, [company], leads), f"Embeddings stored")
+            )
             
-            self._update_task_status(task.agent_id, "completed", 100, f"Research completed successfully")
-            self.logger.info(f"Completed research for {task.company_name}")
+            await self._update_task_status(task.agent_id, "completed", 100, f"Research completed successfully")
+            self.logger.info("Completed research for %s", task.company_name)
             
+        except CircuitOpenError as e:
+            # Nothing is saved, so the company isn't treated as recently researched
+            self.logger.warning("Skipping research for %s: %s", task.company_name, e)
+            await self._update_task_status(task.agent_id, "failed", 0, "provider circuit open")
         except Exception as e:
-            self.logger.error(f"Error researching {task.company_name}: {e}")
-            self._update_task_status(task.agent_id, "failed", 0, f"Error: {str(e)}")
+            self.logger.error("Error researching %s: %s", task.company_name, e)
+            await self._update_task_status(task.agent_id, "failed", 0, f"Error: {str(e)}")
+        
+        return []
     
-    def _update_task_status(self, agent_id: str, status: str, progress: int, message: str):
+    async def _update_task_status(self, agent_id: str, status: str, progress: int, message: str):
         """Update task status"""
-        if agent_id in self.active_tasks:
-            task = self.active_tasks[agent_id]
-            task.status = status
-            task.progress = progress
-            task.message = message
-            
-            # Also update in database
-            self.db.update_agent_status(agent_id, status, progress, message)
-    
-    def get_agent_status(self, agent_id: str) -> Dict[str, Any]:
-        """Get status of a specific agent"""
-        if agent_id in self.active_tasks:
-            task = self.active_tasks[agent_id]
-            return {
-                "agent_id": task.agent_id,
-                "company": task.company_name,
-                "status": task.status,
-                "progress": task.progress,
-                "message": task.message,
-                "created_at": task.created_at.isoformat()
-            }
-        return {}
+        task = self.active_tasks.update(agent_id, status, progress, message)
+        if task is not None:
+            self._notify_status_change()
+            
+            # Also update in database; terminal states write through to sqlite
+            company, created_at = task
+            await asyncio.to_thread(
+                self.db.update_agent_status, agent_id, status, progress, message, company, created_at
+            )
+            
+            # Finished tasks are dropped from memory once clients have had time to see them
+            if status in ("completed", "failed"):
+                asyncio.get_running_loop().call_later(TASK_RETENTION_SECONDS, self._evict_task, agent_id)
+    
+    def _notify_status_change(self):
+        """Wake anyone waiting on a status change"""
+        self._status_version += 1
+        self._status_changed.set()
+        self._status_changed = asyncio.Event()
+    
+    def _evict_task(self, agent_id: str):
+        if self.active_tasks.remove(agent_id):
+            self._notify_status_change()
+    
+    async def wait_for_status_change(self, since_version: int, timeout: float) -> int:
+        """Wait until the status version moves past since_version or timeout expires"""
+        if self._status_version == since_version:
+            try:
+                await asyncio.wait_for(self._status_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._status_version
+    
+    async def get_agent_status(self, agent_id: str) -> Dict[str, Any]:
+        """Get status of a specific agent, from the database once it has been evicted"""
+        status = self.active_tasks.get(agent_id)
+        if status is None:
+            status = await asyncio.to_thread(self.db.get_agent_status, agent_id)
+        return status or {}
     
     def get_all_agent_statuses(self) -> List[Dict[str, Any]]:
         """Get status of all agents"""
-        return [self.get_agent_status(agent_id) for agent_id in self.active_tasks.keys()]
+        return self.active_tasks.all()
     
     async def research_single_company_sync(self, company_name: str) -> Dict[str, Any]:
         """Research a single company synchronously"""
         agent_id = f"sync_{company_name}_{uuid.uuid4()}"
         task = AgentTask(agent_id=agent_id, company_name=company_name, task_type="research")
-        self.active_tasks[agent_id] = task
+        self.active_tasks.add(task)
         
         await self._research_company(task)
         
         # Return results
-        company = self.db.get_company(company_name)
-        leads = self.db.get_leads_by_company(company_name)
+        company = await asyncio.to_thread(self.db.get_company, company_name)
+        leads = await asyncio.to_thread(self.db.get_leads_by_company, company_name)
         
+        # Models are returned as-is so callers don't validate them a second time
         return {
-            "company": company.dict() if company else None,
-            "leads": [lead.dict() for lead in leads],
+            "company": company,
+            "leads": leads,
             "total_leads": len(leads),
-            "status": self.get_agent_status(agent_id)
+            "status": await self.get_agent_status(agent_id)
         }
     
     async def chat_with_data(self, question: str) -> Dict[str, Any]:
         """Chat with all collected data"""
         return await self.embedding_agent.chat_with_data(question)
     
+    def stream_chat_with_data(self, question: str) -> AsyncIterator[Dict[str, Any]]:
+        """Chat with all collected data, streaming the answer as it is generated"""
+        return self.embedding_agent.stream_chat_with_data(question)
+    
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters for the agents' upstream response caches"""
+        return {
+            "lead_agent": dict(self.lead_agent.cache_stats),
+            "competitor_agent": dict(self.competitor_agent.cache_stats)
+        }
+    
     def get_research_summary(self) -> Dict[str, Any]:
         """Get summary of all research data"""
+        # Served from cache until it expires or research writes new data
+        generation = self._summary_generation
+        cached = self._summary_cache
+        if cached and cached[0] == generation and time.monotonic() - cached[1] < SUMMARY_CACHE_TTL_SECONDS:
+            return cached[2]
+        
         companies = self.db.get_all_companies()
+        lead_counts = self.db.get_company_lead_counts()
         total_leads = 0
         
         company_summaries = []
         for company in companies:
-            leads = self.db.get_leads_by_company(company.name)
-            total_leads += len(leads)
+            leads_count = lead_counts.get(company.name, 0)
+            total_leads += leads_count
             
             company_summaries.append({
                 "name": company.name,
                 "industry": company.industry,
                 "size": company.size,
                 "location": company.location,
-                "leads_count": len(leads)
+                "leads_count": leads_count
             })
         
-        return {
+        summary = {
             "total_companies": len(companies),
             "total_leads": total_leads,
             "companies": company_summaries,
             "embedding_stats": self.embedding_agent.get_collection_stats()
         }
+        self._summary_cache = (generation, time.monotonic(), summary)
+        return summary
+    
+    def _invalidate_summary(self):
+        """Drop the cached summary after research data changes"""
+        self._summary_generation += 1
+        self._summary_cache = None
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+# 429s retried by the transport before the response is handed back
+RATE_LIMIT_MAX_RETRIES = 2
+# Pause applied when a 429 carries no usable Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+# Consecutive failures (transport errors or 5xx) that open a provider's circuit
+CIRCUIT_FAIL_MAX = 5
+# How long an open circuit short-circuits calls before letting one probe through
+CIRCUIT_RESET_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while its provider's circuit is open"""
+
+
+class CircuitBreaker:
+    """Fails fast for a provider after repeated consecutive failures"""
+
+    def __init__(self, fail_max: int = CIRCUIT_FAIL_MAX, reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self.reset_timeout:
+            return False
+
+        # Half-open: this request probes, everyone else keeps failing fast until it reports back
+        self._opened_at = now
+        return True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> bool:
+        """Count a failure; True if it just opened the circuit"""
+        self._failures += 1
+        if self._failures < self.fail_max:
+            return False
+        was_closed = self._opened_at is None
+        self._opened_at = time.monotonic()
+        return was_closed
+
+
+class AsyncRateLimiter:
+    """Token bucket shared by every request to one provider"""
+
+    def __init__(self, requests_per_minute: float, burst: Optional[float] = None):
+        self.rate = requests_per_minute / 60.0
+        # Default burst is ten seconds' worth of quota
+        self.capacity = burst if burst is not None else max(1.0, requests_per_minute / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold every waiter back for seconds, e.g. after a 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    """Seconds to wait according to Retry-After, either delta-seconds or an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return DEFAULT_RETRY_AFTER_SECONDS
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport that paces requests per host, backs off together on 429s and trips per-host circuits"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiters: Dict[str, AsyncRateLimiter]):
+        self._transport = transport
+        self._limiters = limiters
+        self._breakers = {host: CircuitBreaker() for host in limiters}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limiters.get(request.url.host)
+        if limiter is None:
+            return await self._transport.handle_async_request(request)
+
+        # A provider that keeps failing is skipped so callers fall back without waiting on timeouts
+        breaker = self._breakers[request.url.host]
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {request.url.host}", request=request)
+
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            await limiter.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                self._record_failure(breaker, request.url.host)
+                raise
+
+            if response.status_code >= 500:
+                self._record_failure(breaker, request.url.host)
+            elif response.status_code != 429:
+                breaker.record_success()
+
+            if response.status_code != 429 or attempt == RATE_LIMIT_MAX_RETRIES:
+                return response
+
+            # Every request to this provider waits out the same window
+            limiter.pause(_retry_after_seconds(response))
+            await response.aclose()
+
+        return response
+
+    @staticmethod
+    def _record_failure(breaker: CircuitBreaker, host: str):
+        if breaker.record_failure():
+            logger.warning("Circuit opened for %s after %d consecutive failures", host, breaker.fail_max)
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from database import DatabaseManager
+from models import CompanyProfile, LeadProfile
+
+
+class SearchContentTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(db_path=os.path.join(self.tmpdir.name, "leads.db"))
+        self.db.save_company_with_leads(
+            CompanyProfile(name="AT&T", description="Telecom carrier", industry="Telecommunications"),
+            [LeadProfile(name="Jane Doe", title="CTO", company="AT&T", department="Engineering")]
+        )
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _types(self, query):
+        return sorted(result["type"] for result in self.db.search_content(query))
+
+    def test_word_query_matches_companies_and_leads(self):
+        self.assertEqual(self._types("tele"), ["company"])
+        self.assertEqual(self._types("jane"), ["lead"])
+
+    def test_infix_query_matches_companies_like_leads(self):
+        self.db.save_company_with_leads(
+            CompanyProfile(name="Microsoft", industry="Software"),
+            [LeadProfile(name="John Roe", title="VP Sales", company="Microsoft")]
+        )
+        self.assertEqual(self._types("icroso"), ["company", "lead"])
+        self.assertEqual(self._types("SOFT"), ["company", "lead"])
+
+    def test_empty_query_lists_companies_and_leads(self):
+        self.assertEqual(self._types(""), ["company", "lead"])
+
+    def test_punctuation_only_query_falls_back_to_like(self):
+        self.assertEqual(self._types("&"), ["company", "lead"])
+        self.assertEqual(self._types("!!!"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()